@@ -0,0 +1,48 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# The core modules import each other by name, like the run scripts do with sys.path.append("../core")
+CORE_PATH = Path(__file__).resolve().parent.parent / "training" / "core"
+sys.path.insert(0, str(CORE_PATH))
+
+
+@pytest.fixture(scope="session")
+def dummy_rom(tmp_path_factory):
+    """An empty 32 KiB cartridge with a valid header checksum, so the env runs without the game"""
+    rom = bytearray(32 * 1024)
+    rom[0x14D] = 0xE7
+    path = tmp_path_factory.mktemp("rom") / "dummy.gb"
+    path.write_bytes(rom)
+    return path
+
+
+@pytest.fixture(scope="session")
+def dummy_state(dummy_rom):
+    from pyboy import PyBoy
+
+    path = dummy_rom.with_suffix(".state")
+    pyboy = PyBoy(str(dummy_rom), window="null")
+    # A party of six, so the HP and level stats are not all zero
+    for slot in range(6):
+        pyboy.memory[0xD16C + 0x2C * slot + 1] = 10  # HP
+        pyboy.memory[0xD18D + 0x2C * slot + 1] = 20  # Max HP
+        pyboy.memory[0xD18C + 0x2C * slot] = 5  # Level
+    with open(path, "wb") as f:
+        pyboy.save_state(f)
+    pyboy.stop(save=False)
+    return path
+
+
+@pytest.fixture
+def env_config(dummy_rom, dummy_state, tmp_path):
+    return {
+        "gb_path": str(dummy_rom),
+        "init_state": str(dummy_state),
+        "headless": True,
+        "session_path": tmp_path / "session",
+        "print_rewards": False,
+        "max_steps": 64,
+        "rank": 0,
+    }
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+from BatchedPokeRed import BatchedPokeRed
+from BatchedVecEnv import BatchedVecEnv
+from PokeRed import PokeRed
+from RedGymEnv import make_env
+
+NUM_EMULATORS = 3
+
+
+def make_different(emulator, index):
+    """Give every emulator its own party level and event flags"""
+    emulator.pyboy.memory[0xD18C] = 5 + index
+    emulator.pyboy.memory[PokeRed.EVENT_FLAGS_START + 20 + index] = 0xFF >> index
+
+
+def test_parity_with_separate_emulators(dummy_rom, dummy_state):
+    batched = BatchedPokeRed(str(dummy_rom), NUM_EMULATORS, state_file=str(dummy_state))
+    separate = [PokeRed(str(dummy_rom), state_file=str(dummy_state), hide_window=True) for _ in range(NUM_EMULATORS)]
+    for index in range(NUM_EMULATORS):
+        make_different(batched.emulators[index], index)
+        make_different(separate[index], index)
+
+    # The empty cartridge overwrites the work RAM after a few actions, until then the emulators differ
+    actions = np.random.default_rng(0).integers(0, len(PokeRed.VALID_ACTIONS), size=(3, NUM_EMULATORS))
+    for step_actions in actions:
+        stats, frames = batched.step(step_actions)
+        for index, emulator in enumerate(separate):
+            emulator.run_action(int(step_actions[index]))
+            expected = emulator.get_all_stats()
+            assert np.array_equal(stats[index], emulator.stat_snapshot.values)
+            assert batched.stats_dict(index) == expected
+            assert batched.events[index] == expected["Events"]
+            assert np.array_equal(frames[index], emulator.get_screen())
+    # Each row has to come from its own emulator
+    assert len({row.tobytes() for row in stats}) == NUM_EMULATORS
+
+
+def test_wrong_number_of_actions(dummy_rom, dummy_state):
+    batched = BatchedPokeRed(str(dummy_rom), 2, state_file=str(dummy_state))
+    with pytest.raises(ValueError):
+        batched.step([0])
+    with pytest.raises(ValueError):
+        batched.step([0, 1, 2])
+    with pytest.raises(ValueError):
+        BatchedPokeRed.from_emulators([])
+
+
+def test_batched_vec_env_matches_dummy_vec_env(env_config):
+    # Short episodes, so the auto resets are covered too
+    config = {**env_config, "max_steps": 4}
+    vec_envs = [
+        vec_env_class([make_env(rank, {**config, "instance_id": f"{name}{rank}"}, seed=7) for rank in range(2)])
+        for name, vec_env_class in (("dummy", DummyVecEnv), ("batched", BatchedVecEnv))
+    ]
+    try:
+        for vec_env in vec_envs:
+            vec_env.seed(3)
+        reference, batched = vec_envs
+        assert np.array_equal(reference.reset(), batched.reset())
+        terminal_observations = 0
+        for step in range(10):
+            actions = np.array([step % 7, (step * 3) % 7])
+            obs_a, rewards_a, dones_a, infos_a = reference.step(actions)
+            obs_b, rewards_b, dones_b, infos_b = batched.step(actions)
+            assert np.array_equal(obs_a, obs_b)
+            assert np.array_equal(rewards_a, rewards_b)
+            assert np.array_equal(dones_a, dones_b)
+            for info_a, info_b in zip(infos_a, infos_b):
+                assert info_a.keys() == info_b.keys()
+                if "terminal_observation" in info_a:
+                    assert np.array_equal(info_a["terminal_observation"], info_b["terminal_observation"])
+                    terminal_observations += 1
+        # Both envs finished after steps 4 and 8
+        assert terminal_observations == 4
+    finally:
+        for vec_env in vec_envs:
+            vec_env.close()
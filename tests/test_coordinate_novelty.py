@@ -0,0 +1,55 @@
+import numpy as np
+
+from CoordinateNovelty import CoordinateNovelty
+
+
+def brute_force_counts(positions, sim_dist):
+    """What the old [x, y, map * 1000] knn index counted: novel if no counted position
+    on the same map is within sim_dist (squared distance)"""
+    counted = []
+    novel = []
+    for x, y, map_id in positions:
+        is_novel = all(
+            m != map_id or (x - cx) ** 2 + (y - cy) ** 2 > sim_dist for cx, cy, m in counted
+        )
+        if is_novel:
+            counted.append((x, y, map_id))
+        novel.append(is_novel)
+    return novel
+
+
+def test_matches_brute_force_on_random_walk():
+    rng = np.random.default_rng(0)
+    steps = rng.integers(-1, 2, size=(2000, 2))
+    xy = np.clip(np.cumsum(steps, axis=0) + 128, 0, 255)
+    maps = rng.integers(0, 3, size=2000)
+    positions = [(int(x), int(y), int(m)) for (x, y), m in zip(xy, maps)]
+
+    novelty = CoordinateNovelty(sim_dist=4)
+    novel = [novelty.update(*position) for position in positions]
+    assert novel == brute_force_counts(positions, 4)
+    assert novelty.count == sum(novel)
+
+
+def test_near_positions_are_not_novel_on_the_same_map_only():
+    novelty = CoordinateNovelty(sim_dist=4)
+    assert novelty.update(10, 10, 1)
+    assert not novelty.update(12, 10, 1)
+    assert novelty.update(13, 10, 1)
+    assert novelty.update(12, 10, 2)
+
+
+def test_edges_of_the_map():
+    novelty = CoordinateNovelty(sim_dist=4)
+    assert novelty.update(0, 0, 0)
+    assert novelty.update(255, 255, 255)
+    assert not novelty.update(254, 255, 255)
+
+
+def test_reset_forgets_positions():
+    novelty = CoordinateNovelty()
+    novelty.update(5, 5, 3)
+    novelty.reset()
+    assert novelty.count == 0
+    assert not novelty.covered.any()
+    assert novelty.update(5, 5, 3)
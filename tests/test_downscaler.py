@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from Downscaler import Downscaler
+from GameFrames import game_like_frames
+
+
+def block_mean(frame, factor=4):
+    """Reference: the float mean of every block, rounded half up"""
+    channel = frame[:, :, 0].astype(np.float64)
+    height, width = channel.shape
+    blocks = channel.reshape(height // factor, factor, width // factor, factor)
+    return np.floor(blocks.mean(axis=(1, 3)) + 0.5).astype(np.uint8)[:, :, None]
+
+
+def test_exact_rounded_block_mean():
+    frames = np.random.default_rng(0).integers(0, 256, size=(5, 144, 160, 4), dtype=np.uint8)
+    downscaler = Downscaler()
+    for frame in frames:
+        assert np.array_equal(downscaler.downscale(frame), block_mean(frame))
+
+
+def test_shape_and_grayscale_input():
+    frame = np.full((144, 160), 85, dtype=np.uint8)
+    out = Downscaler().downscale(frame)
+    assert out.shape == (36, 40, 1)
+    assert (out == 85).all()
+
+
+def test_other_factors_and_invalid_shapes():
+    frame = np.random.default_rng(1).integers(0, 256, size=(144, 160, 1), dtype=np.uint8)
+    assert np.array_equal(Downscaler(factor=2).downscale(frame), block_mean(frame, 2))
+    with pytest.raises(ValueError):
+        Downscaler(in_shape=(144, 160), factor=7)
+
+
+def test_exact_on_game_like_frames():
+    downscaler = Downscaler()
+    for frame in game_like_frames(20, seed=0):
+        assert np.array_equal(downscaler.downscale(frame), block_mean(frame))
+
+
+def test_flat_tiles_keep_their_shade():
+    # Every 4x4 block lies inside one 8x8 tile, so flat tiles come out unchanged
+    for frame in game_like_frames(5, seed=1, flat_fraction=1.0):
+        assert np.array_equal(Downscaler().downscale(frame), frame[::4, ::4, :1])
+
+
+def test_halves_round_up():
+    # Block sums of 8 and 24 are means of 0.5 and 1.5
+    frame = np.zeros((144, 160), dtype=np.uint8)
+    frame[0:2, 0:4] = 1
+    frame[0:4, 4:8] = 1
+    frame[0:2, 4:8] = 2
+    out = Downscaler().downscale(frame)
+    assert (out[0, 0, 0], out[0, 1, 0]) == (1, 2)
+    assert np.array_equal(out, block_mean(frame[:, :, None]))
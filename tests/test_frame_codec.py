@@ -0,0 +1,81 @@
+import numpy as np
+
+from FrameCodec import (
+    PACKED_SHAPE,
+    PALETTE,
+    FrameDelta,
+    decode_frame,
+    is_packed,
+    pack_frame,
+    unpack_frame,
+)
+
+
+def random_indices(seed):
+    return np.random.default_rng(seed).integers(0, 4, size=(144, 160), dtype=np.uint8)
+
+
+def rgba_screen(indices):
+    """A screen like PyBoy renders it with the default palette"""
+    screen = np.repeat(PALETTE[indices][:, :, None], 4, axis=2)
+    screen[:, :, 3] = 255
+    return screen
+
+
+def test_pack_unpack_round_trip():
+    indices = random_indices(0)
+    packed = pack_frame(rgba_screen(indices))
+    assert packed.shape == PACKED_SHAPE and is_packed(packed)
+    assert np.array_equal(unpack_frame(packed), indices)
+
+
+def test_decode_restores_the_screen():
+    indices = random_indices(1)
+    screen = rgba_screen(indices)
+    packed = pack_frame(screen)
+    assert np.array_equal(decode_frame(packed), screen)
+    assert np.array_equal(decode_frame(packed, channels=1), screen[:, :, :1])
+
+
+def test_single_channel_input_and_nearest_shade():
+    indices = random_indices(2)
+    gray = PALETTE[indices]
+    assert np.array_equal(unpack_frame(pack_frame(gray)), indices)
+    # Values between the shades go to the nearest one
+    off_palette = np.full((144, 160), 250, dtype=np.uint8)
+    assert (unpack_frame(pack_frame(off_palette)) == 0).all()
+
+
+def test_first_pixel_is_in_the_lowest_bits():
+    indices = np.zeros((144, 160), dtype=np.uint8)
+    indices[0, :4] = [1, 2, 3, 0]
+    packed = pack_frame(PALETTE[indices])
+    assert packed[0, 0] == 1 | 2 << 2 | 3 << 4
+
+
+def test_pack_into_out_buffer():
+    out = np.empty(PACKED_SHAPE, dtype=np.uint8)
+    indices = random_indices(3)
+    assert pack_frame(PALETTE[indices], out) is out
+    assert np.array_equal(unpack_frame(out), indices)
+
+
+def test_is_packed_rejects_screens():
+    assert not is_packed(rgba_screen(random_indices(4)))
+
+
+def test_frame_delta_round_trip_with_keyframes():
+    frames = [pack_frame(PALETTE[random_indices(seed)]) for seed in range(10)]
+    encoder, decoder = FrameDelta(keyframe_interval=4), FrameDelta(keyframe_interval=4)
+    for i, frame in enumerate(frames):
+        keyframe, data = encoder.encode(frame)
+        assert keyframe == (i % 4 == 0)
+        assert np.array_equal(decoder.decode(keyframe, data), frame)
+
+
+def test_frame_delta_of_equal_frames_is_zero():
+    frame = pack_frame(PALETTE[random_indices(5)])
+    encoder = FrameDelta()
+    encoder.encode(frame)
+    keyframe, data = encoder.encode(frame)
+    assert not keyframe and not data.any()
@@ -0,0 +1,48 @@
+from collections import deque
+
+import numpy as np
+
+from FrameStack import FrameStack
+
+
+def reference_stack(frames, stacks, shape):
+    """Like VecFrameStack: zeros before the first frame, oldest first along the channels"""
+    window = deque([np.zeros(shape, dtype=np.uint8)] * stacks, maxlen=stacks)
+    for frame in frames:
+        window.append(frame)
+    return np.concatenate(window, axis=2)
+
+
+def test_matches_reference_over_many_pushes():
+    shape = (4, 5, 2)
+    rng = np.random.default_rng(0)
+    frames = [rng.integers(0, 256, size=shape, dtype=np.uint8) for _ in range(10)]
+    stack = FrameStack(shape, 3)
+    assert np.array_equal(stack.reset(frames[0]), reference_stack(frames[:1], 3, shape))
+    for i in range(1, len(frames)):
+        assert np.array_equal(stack.push(frames[i]), reference_stack(frames[: i + 1], 3, shape))
+
+
+def test_newest_frame_is_last():
+    stack = FrameStack((1, 1, 1), 3)
+    stack.reset(np.full((1, 1, 1), 1, dtype=np.uint8))
+    stack.push(np.full((1, 1, 1), 2, dtype=np.uint8))
+    observation = stack.push(np.full((1, 1, 1), 3, dtype=np.uint8))
+    assert observation[0, 0].tolist() == [1, 2, 3]
+    assert stack.shape == observation.shape
+
+
+def test_reset_clears_older_frames():
+    stack = FrameStack((1, 1, 1), 3)
+    stack.reset(np.full((1, 1, 1), 9, dtype=np.uint8))
+    stack.push(np.full((1, 1, 1), 9, dtype=np.uint8))
+    observation = stack.reset(np.full((1, 1, 1), 4, dtype=np.uint8))
+    assert observation[0, 0].tolist() == [0, 0, 4]
+
+
+def test_push_returns_a_view_of_the_ring():
+    stack = FrameStack((2, 2, 1), 2)
+    observation = stack.reset(np.ones((2, 2, 1), dtype=np.uint8))
+    assert np.shares_memory(observation, stack.buffer)
+    # Only the channels are a window of the ring, the rows are 2 * stacks slots apart
+    assert not observation.flags.c_contiguous
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from KnnHandler import KnnHandler
+
+
+def distinct_frames(count, dim=16):
+    """Frames far apart from each other, every one of them is novel"""
+    frames = [np.zeros(dim, dtype=np.uint8) for _ in range(count)]
+    for i, frame in enumerate(frames):
+        frame[i] = 255
+    return frames
+
+
+def make_handler(**kwargs):
+    return KnnHandler(vec_dim=16, sim_frame_dist=10, **kwargs)
+
+
+def test_similar_frames_are_not_novel():
+    knn = make_handler(num_elements=8)
+    frame = np.zeros(16, dtype=np.uint8)
+    assert knn.update_frame_knn_index(frame)
+    assert not knn.update_frame_knn_index(frame + 0)
+    assert knn.count == 1
+
+
+def test_clear_reuses_the_index():
+    knn = make_handler(num_elements=4)
+    index = knn.knn_index
+    frames = distinct_frames(6)
+    for frame in frames[:3]:
+        knn.update_frame_knn_index(frame)
+
+    knn.clear()
+    assert knn.knn_index is index
+    assert knn.count == 0 and knn.number_of_frames() == 0
+    assert knn.deleted == 3
+    # Frames of the last episode are novel again, and take the slots of the deleted ones
+    for frame in frames[:3]:
+        assert knn.update_frame_knn_index(frame)
+    assert index.get_current_count() == 3 and knn.deleted == 0
+    # Past the deleted slots the index grows as usual
+    for frame in frames[3:]:
+        assert knn.update_frame_knn_index(frame)
+    assert knn.knn_index is index
+    assert knn.count == 6 and index.get_current_count() == 6
+    assert not any(knn.is_frame_novel(frame) for frame in frames)
+
+
+def test_repeated_clears_keep_counting_correctly():
+    knn = make_handler(num_elements=8, max_elements=8)
+    index = knn.knn_index
+    frames = distinct_frames(8)
+    for episode in range(5):
+        for frame in frames[episode % 3 :]:
+            assert knn.update_frame_knn_index(frame)
+        assert not knn.update_frame_knn_index(frames[-1])
+        assert knn.count == knn.number_of_frames() == len(frames) - episode % 3
+        assert index.get_current_count() - knn.deleted == knn.count
+        knn.clear()
+    assert knn.knn_index is index and index.get_max_elements() == 8
+
+
+def test_rebuild_clear_starts_an_empty_index_with_the_grown_capacity():
+    knn = make_handler(num_elements=2, max_elements=4, capacity_policy="grow", clear_policy="rebuild")
+    for frame in distinct_frames(3):
+        knn.update_frame_knn_index(frame)
+    assert knn.num_elements == 4
+
+    knn.clear()
+    assert knn.count == 0 and knn.number_of_frames() == 0
+    assert knn.next_label == 0 and knn.deleted == 0
+    assert knn.knn_index.get_current_count() == 0
+    assert knn.knn_index.get_max_elements() == 4
+    assert knn.update_frame_knn_index(distinct_frames(1)[0])
+
+
+def test_search_cut_off_by_deleted_frames_falls_back_to_all_live_frames():
+    knn = make_handler(num_elements=4)
+    frames = distinct_frames(3)
+    for frame in frames:
+        knn.update_frame_knn_index(frame)
+
+    knn.knn_index = FailingQueries(knn.knn_index)
+    assert not knn.is_frame_novel(frames[1])
+    assert knn.nearest_distance(frames[1].astype(np.float32) + 1) == 16.0
+    assert knn.is_frame_novel(np.full(16, 50, dtype=np.uint8))
+
+
+class FailingQueries:
+    """An index whose graph search never reaches a live frame"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def knn_query(self, *args, **kwargs):
+        raise RuntimeError("Cannot return the results in a contiguous 2D array. Probably ef or M is too small")
+
+    def __getattr__(self, name):
+        return getattr(self.index, name)
+
+
+def test_unknown_policies():
+    with pytest.raises(ValueError):
+        make_handler(capacity_policy="shrink")
+    with pytest.raises(ValueError):
+        make_handler(clear_policy="forget")
+
+
+def test_evict_policy_keeps_the_newest_frames():
+    knn = make_handler(num_elements=2, capacity_policy="evict")
+    frames = distinct_frames(3)
+    for frame in frames:
+        assert knn.update_frame_knn_index(frame)
+    assert knn.number_of_frames() == 2
+    assert knn.knn_index.get_current_count() - knn.deleted == 2
+    # The oldest frame was evicted, the newest is still known
+    assert knn.is_frame_novel(frames[0])
+    assert not knn.is_frame_novel(frames[2])
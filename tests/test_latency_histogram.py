@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from LatencyHistogram import LatencyHistogram
+
+# Width of a bin with the default 10 bins per decade
+BIN_RATIO = 10 ** 0.1
+
+
+def test_quantiles_are_the_upper_edge_of_their_bin():
+    samples = np.random.default_rng(0).lognormal(np.log(2e-3), 1.0, size=10_000)
+    histogram = LatencyHistogram()
+    for seconds in samples:
+        histogram.add(seconds)
+
+    summary = histogram.summary()
+    assert summary["count"] == len(samples)
+    assert summary["mean"] == pytest.approx(samples.mean())
+    assert summary["max"] == samples.max()
+    for name, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+        exact = np.quantile(samples, q)
+        assert exact <= summary[name] <= exact * BIN_RATIO
+
+
+def test_out_of_range_durations():
+    histogram = LatencyHistogram(min_seconds=1e-3, max_seconds=1.0)
+    for seconds in (1e-5, 1e-5, 1e-5, 5.0):
+        histogram.add(seconds)
+    # Below the range the quantile is the lowest edge, above it the max
+    assert histogram.quantile(0.5) == 1e-3
+    assert histogram.quantile(0.99) == 5.0
+    assert histogram.counts[0] == 3 and histogram.counts[-1] == 1
+
+
+def test_merge_equals_adding_everything_to_one():
+    rng = np.random.default_rng(1)
+    first, second = rng.exponential(1e-3, 500), rng.exponential(5e-2, 500)
+    merged, combined, other = LatencyHistogram(), LatencyHistogram(), LatencyHistogram()
+    for seconds in first:
+        merged.add(seconds)
+        combined.add(seconds)
+    for seconds in second:
+        other.add(seconds)
+        combined.add(seconds)
+    merged.merge(other)
+    assert np.array_equal(merged.counts, combined.counts)
+    assert merged.summary() == pytest.approx(combined.summary())
+
+
+def test_empty_and_reset():
+    histogram = LatencyHistogram()
+    assert histogram.summary() == {"count": 0, "mean": 0.0, "p50": 0.0, "p90": 0.0, "p99": 0.0, "max": 0.0}
+    histogram.add(0.1)
+    histogram.reset()
+    assert histogram.summary()["count"] == 0 and histogram.counts.sum() == 0
+
+
+def test_invalid_range():
+    with pytest.raises(ValueError):
+        LatencyHistogram(min_seconds=1.0, max_seconds=0.5)
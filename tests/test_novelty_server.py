@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from NoveltyServer import NoveltyClient, NoveltyServer
+
+
+@pytest.fixture
+def server():
+    server = NoveltyServer(vec_dim=16, sim_frame_dist=10, num_elements=8)
+    server.start()
+    yield server
+    server.stop()
+
+
+def frames(*values):
+    return np.array([np.full(16, value, dtype=np.uint8) for value in values])
+
+
+def test_second_client_sees_frames_of_the_first(server):
+    first, second = NoveltyClient(server.address), NoveltyClient(server.address)
+    try:
+        assert first.submit(frames(0, 100)).tolist() == [True, True]
+        assert second.submit(frames(0, 100, 200)).tolist() == [False, False, True]
+        stats = second.stats()
+        assert stats["frames"] == 3
+        assert stats["workers"] == 2
+    finally:
+        first.close()
+        second.close()
+
+
+def test_clear_forgets_frames_of_all_clients(server):
+    first, second = NoveltyClient(server.address), NoveltyClient(server.address)
+    try:
+        first.submit(frames(0))
+        assert second.clear()
+        assert second.stats()["frames"] == 0
+        assert first.submit(frames(0)).tolist() == [True]
+    finally:
+        first.close()
+        second.close()
+
+
+def test_stop_shuts_the_server_down(server):
+    client = NoveltyClient(server.address)
+    client.submit(frames(0))
+    process = server.process
+    server.stop()
+    assert not process.is_alive()
+    with pytest.raises((EOFError, OSError)):
+        client.submit(frames(1))
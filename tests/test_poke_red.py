@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from PokeRed import PokeRed
+from PokeRedRewarder import PokeRedRewarder
+
+
+@pytest.fixture
+def poke_red(dummy_rom, dummy_state):
+    poke_red = PokeRed(str(dummy_rom), state_file=str(dummy_state), hide_window=True)
+    yield poke_red
+    poke_red.pyboy.stop(save=False)
+
+
+def write_flags(poke_red, flags):
+    for offset, value in enumerate(flags):
+        poke_red.pyboy.memory[PokeRed.EVENT_FLAGS_START + offset] = int(value)
+
+
+def reference_event_count(flags):
+    """Set bits one by one, without the base flags and the museum ticket"""
+    events = sum(bin(int(value)).count("1") for value in flags)
+    museum_address, museum_bit = PokeRed.MUSEUM_TICKET
+    museum_ticket = (int(flags[museum_address - PokeRed.EVENT_FLAGS_START]) >> museum_bit) & 1
+    return max(events - PokeRed.BASE_EVENT_FLAGS - museum_ticket, 0)
+
+
+def test_event_count_matches_counting_bits(poke_red):
+    num_flags = PokeRed.EVENT_FLAGS_END - PokeRed.EVENT_FLAGS_START
+    rng = np.random.default_rng(0)
+    for _ in range(5):
+        flags = rng.integers(0, 256, size=num_flags, dtype=np.uint8)
+        write_flags(poke_red, flags)
+        assert poke_red.read_event_count() == reference_event_count(flags)
+
+
+def test_event_count_range_and_museum_ticket(poke_red):
+    num_flags = PokeRed.EVENT_FLAGS_END - PokeRed.EVENT_FLAGS_START
+    # The base flags are always set, fewer clamp to 0
+    write_flags(poke_red, np.zeros(num_flags, dtype=np.uint8))
+    assert poke_red.read_event_count() == 0
+    poke_red.pyboy.memory[PokeRed.EVENT_FLAGS_START] = 0xFF
+    assert poke_red.read_event_count() == 0
+
+    flags = np.zeros(num_flags, dtype=np.uint8)
+    flags[:2] = 0xFF
+    write_flags(poke_red, flags)
+    assert poke_red.read_event_count() == 16 - PokeRed.BASE_EVENT_FLAGS
+
+    # The museum ticket is no event
+    museum_address, museum_bit = PokeRed.MUSEUM_TICKET
+    poke_red.pyboy.memory[museum_address] = 1 << museum_bit
+    assert poke_red.read_event_count() == 16 - PokeRed.BASE_EVENT_FLAGS
+    poke_red.pyboy.memory[museum_address] = 0xFF
+    assert poke_red.read_event_count() == 16 + 7 - PokeRed.BASE_EVENT_FLAGS
+
+    # The first and last flag byte count, the bytes around them don't
+    poke_red.pyboy.memory[PokeRed.EVENT_FLAGS_END - 1] = 0x01
+    poke_red.pyboy.memory[PokeRed.EVENT_FLAGS_END] = 0xFF
+    poke_red.pyboy.memory[PokeRed.EVENT_FLAGS_START - 1] = 0xFF
+    assert poke_red.read_event_count() == 16 + 7 + 1 - PokeRed.BASE_EVENT_FLAGS
+
+
+def test_events_stay_out_of_the_total_by_default():
+    stats = {"Level": [5] * 6, "XP": [0] * 6, "Badges": 0, "Relative HP": 0.5, "X": 1, "Y": 2, "Map": 0}
+    frame = np.zeros((36, 40, 1), dtype=np.uint8)
+    totals = {}
+    for events in (0, 40):
+        rewarder = PokeRedRewarder(num_elements=16)
+        rewards = rewarder.update_rewards({**stats, "Events": events}, frame)
+        assert rewards["events"] == 0
+        totals[events] = rewards["total"]
+    assert totals[0] == totals[40]
+
+    rewarder = PokeRedRewarder(num_elements=16, events_weight=0.5)
+    assert rewarder.update_rewards({**stats, "Events": 40}, frame)["events"] == 20
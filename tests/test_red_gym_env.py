@@ -0,0 +1,26 @@
+import json
+
+from RedGymEnv import RedGymEnv
+
+
+def run_steps(env, steps):
+    env.reset(seed=1)
+    for step in range(steps):
+        env.step(step % 7)
+    env.close()
+
+
+def test_envs_write_their_own_step_timing_files(env_config):
+    config = {**env_config, "step_timing": True, "step_timing_interval": 2}
+    first, second = RedGymEnv(config), RedGymEnv(config)
+    assert first.instance_id is not None
+    assert first.instance_id != second.instance_id
+    run_steps(first, 4)
+    run_steps(second, 4)
+
+    files = sorted(config["session_path"].glob("step_timing_*.json"))
+    assert [f.name for f in files] == sorted(
+        f"step_timing_{env.instance_id}.json" for env in (first, second)
+    )
+    for f in files:
+        assert json.loads(f.read_text())["steps"] == 4
@@ -0,0 +1,78 @@
+import pytest
+
+from RedGymEnv import RedGymEnv
+from ReplayEngine import ReplayEngine, ReplayMismatch
+from TrajectoryLog import KEYFRAMES_FILE, read_keyframes
+
+EPISODE_STEPS = 10
+KEYFRAME_INTERVAL = 4
+
+
+@pytest.fixture
+def log_path(env_config):
+    config = {**env_config, "trajectory_log": True, "trajectory_keyframe_interval": KEYFRAME_INTERVAL}
+    env = RedGymEnv(config)
+    for seed in (1, 2):
+        env.reset(seed=seed)
+        for step in range(EPISODE_STEPS):
+            env.step(step % 7)
+    env.close()
+    return config["session_path"] / "trajectories" / env.instance_id
+
+
+def engine(env_config, log_path, **kwargs):
+    return ReplayEngine(env_config["gb_path"], log_path, **kwargs)
+
+
+def corrupt_checksum(log_path, row, length_zero):
+    keyframes = read_keyframes(log_path)
+    match = (keyframes["row"] == row) & ((keyframes["length"] == 0) == length_zero)
+    assert match.sum() == 1
+    keyframes["crc"][match] ^= 1
+    (log_path / KEYFRAMES_FILE).write_bytes(keyframes.tobytes())
+
+
+def test_episode_end_checksums_are_recorded(log_path):
+    keyframes = read_keyframes(log_path)
+    ends = keyframes[keyframes["length"] == 0]
+    assert ends["row"].tolist() == [EPISODE_STEPS, 2 * EPISODE_STEPS]
+    states = keyframes[keyframes["length"] > 0]
+    assert states["row"].tolist() == [0, 4, 8, 10, 14, 18]
+
+
+def test_verify_episode_checks_every_keyframe_and_the_last_step(env_config, log_path):
+    replay = engine(env_config, log_path)
+    for episode in (0, 1):
+        # The keyframes at steps 4 and 8, and the checksum after step 9
+        assert replay.verify_episode(episode) == 3
+        assert replay.row == (episode + 1) * EPISODE_STEPS
+
+
+def test_corrupted_last_step_is_detected(env_config, log_path):
+    corrupt_checksum(log_path, EPISODE_STEPS, length_zero=True)
+    replay = engine(env_config, log_path)
+    with pytest.raises(ReplayMismatch, match="end of the episode"):
+        replay.verify_episode(0)
+    replay.verify_episode(1)
+
+
+def test_corrupted_keyframe_is_detected(env_config, log_path):
+    corrupt_checksum(log_path, 4, length_zero=False)
+    replay = engine(env_config, log_path)
+    with pytest.raises(ReplayMismatch, match="the keyframe"):
+        replay.verify_episode(0)
+
+
+def test_seeks_match_a_straight_replay(env_config, log_path):
+    straight = engine(env_config, log_path)
+    straight.seek(0)
+    checksums = [straight.poke_red.ram_checksum()]
+    for _ in range(2 * EPISODE_STEPS - 1):
+        straight.advance(1, render=False)
+        checksums.append(straight.poke_red.ram_checksum())
+
+    replay = engine(env_config, log_path)
+    for row in (13, 2, 19, 9, 10, 5, 0):
+        replay.seek(row)
+        assert replay.row == row
+        assert replay.poke_red.ram_checksum() == checksums[row]
@@ -0,0 +1,201 @@
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import gymnasium
+import numpy as np
+import pytest
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import SubprocVecEnv
+
+from conftest import CORE_PATH
+from SharedMemoryVecEnv import SharedMemoryVecEnv
+
+
+class CountingEnv(gymnasium.Env):
+    """Deterministic env: terminates when the counter hits a multiple of 7, truncates after
+    `length` steps, and has an info only on some steps"""
+
+    def __init__(self, rank, length, dict_obs):
+        self.rank = rank
+        self.length = length
+        box = spaces.Box(0, 255, shape=(2, 3), dtype=np.uint8)
+        self.observation_space = spaces.Dict({"frame": box, "stats": box}) if dict_obs else box
+        self.action_space = spaces.Discrete(3)
+        self.counter = 0
+        self.steps = 0
+
+    def observation(self):
+        frame = np.full((2, 3), self.counter % 256, dtype=np.uint8)
+        if isinstance(self.observation_space, spaces.Dict):
+            return {"frame": frame, "stats": 255 - frame}
+        return frame
+
+    def reset(self, seed=None, options=None):
+        self.counter = (seed or 0) + self.rank
+        self.steps = 0
+        return self.observation(), {"reset_counter": self.counter}
+
+    def step(self, action):
+        self.counter += int(action) + 1
+        self.steps += 1
+        terminated = self.counter % 7 == 0
+        truncated = self.steps >= self.length
+        info = {"counter": self.counter} if self.steps % 2 else {}
+        return self.observation(), float(self.counter), terminated, truncated, info
+
+
+def make_counting_env(rank, dict_obs):
+    return lambda: CountingEnv(rank, length=3 + rank, dict_obs=dict_obs)
+
+
+def assert_obs_equal(a, b):
+    if isinstance(a, dict):
+        assert a.keys() == b.keys()
+        for key in a:
+            assert np.array_equal(a[key], b[key])
+    else:
+        assert np.array_equal(a, b)
+
+
+def assert_infos_equal(a, b):
+    assert len(a) == len(b)
+    for info_a, info_b in zip(a, b):
+        assert info_a.keys() == info_b.keys()
+        for key in info_a:
+            if key == "terminal_observation":
+                assert_obs_equal(info_a[key], info_b[key])
+            else:
+                assert info_a[key] == info_b[key]
+
+
+@pytest.mark.parametrize("dict_obs", [False, True])
+def test_parity_with_subproc_vec_env(dict_obs):
+    env_fns = [make_counting_env(rank, dict_obs) for rank in range(3)]
+    reference = SubprocVecEnv(env_fns, start_method="fork")
+    shared = SharedMemoryVecEnv(env_fns, start_method="fork")
+    try:
+        for vec_env in (reference, shared):
+            vec_env.seed(10)
+        assert_obs_equal(reference.reset(), shared.reset())
+        assert list(reference.reset_infos) == list(shared.reset_infos)
+
+        actions = np.random.default_rng(0).integers(0, 3, size=(30, 3))
+        dones_seen = 0
+        for step_actions in actions:
+            obs_a, rewards_a, dones_a, infos_a = reference.step(step_actions)
+            obs_b, rewards_b, dones_b, infos_b = shared.step(step_actions)
+            assert_obs_equal(obs_a, obs_b)
+            assert np.array_equal(rewards_a, rewards_b)
+            assert np.array_equal(dones_a, dones_b)
+            assert_infos_equal(infos_a, infos_b)
+            assert list(reference.reset_infos) == list(shared.reset_infos)
+            dones_seen += dones_a.sum()
+        # Both terminations and truncations happened
+        assert dones_seen > 0
+    finally:
+        reference.close()
+        shared.close()
+
+
+def test_terminal_observation_survives_auto_reset():
+    shared = SharedMemoryVecEnv([make_counting_env(0, False)], start_method="fork")
+    try:
+        shared.reset()
+        # Truncated after 3 steps, the counter is then 3 (the reset obs is 0 again)
+        for _ in range(3):
+            obs, _, dones, infos = shared.step(np.zeros(1, dtype=np.int64))
+        assert dones[0] and infos[0]["TimeLimit.truncated"]
+        assert (infos[0]["terminal_observation"] == 3).all()
+        assert (obs[0] == 0).all()
+        # The next steps don't change the returned copies
+        shared.step(np.zeros(1, dtype=np.int64))
+        assert (infos[0]["terminal_observation"] == 3).all()
+    finally:
+        shared.close()
+
+
+def test_send_recv_on_some_envs():
+    shared = SharedMemoryVecEnv([make_counting_env(rank, False) for rank in range(3)], start_method="fork")
+    try:
+        shared.reset()
+        # The counters start at the rank and go up by action + 1
+        shared.send([2, 0], env_ids=[2, 0])
+        with pytest.raises(RuntimeError):
+            shared.send([1], env_ids=[0])
+        with pytest.raises(RuntimeError):
+            shared.step(np.zeros(3, dtype=np.int64))
+        env_ids, obs, rewards, dones, infos = shared.recv()
+        assert env_ids.tolist() == [0, 2]
+        assert rewards.tolist() == [1.0, 5.0]
+        assert obs[:, 0, 0].tolist() == [1, 5]
+        assert dones.tolist() == [False, False]
+        assert [info["counter"] for info in infos] == [1, 5]
+        assert shared.pending == set()
+
+        shared.send([1], env_ids=[1])
+        env_ids, obs, rewards, _, _ = shared.recv()
+        assert env_ids.tolist() == [1]
+        assert rewards.tolist() == [3.0]
+        # Env 0 was not stepped by the second send
+        _, rewards, _, _ = shared.step(np.zeros(3, dtype=np.int64))
+        assert rewards.tolist() == [2.0, 4.0, 6.0]
+    finally:
+        shared.close()
+
+
+def test_recv_returns_every_env_once():
+    shared = SharedMemoryVecEnv([make_counting_env(rank, False) for rank in range(4)], start_method="fork")
+    try:
+        shared.reset()
+        shared.send(np.zeros(4, dtype=np.int64))
+        received = []
+        while shared.pending:
+            env_ids, obs, _, _, _ = shared.recv(batch_size=1, timeout=0.0)
+            assert len(env_ids) >= 1 and len(obs) == len(env_ids)
+            received += env_ids.tolist()
+        assert sorted(received) == [0, 1, 2, 3]
+        assert sum(histogram.count for histogram in shared.latencies) == 4
+    finally:
+        shared.close()
+
+
+def test_recv_without_send_raises():
+    shared = SharedMemoryVecEnv([make_counting_env(0, False)], start_method="fork")
+    try:
+        shared.reset()
+        with pytest.raises(RuntimeError, match="send"):
+            shared.recv()
+        shared.step(np.zeros(1, dtype=np.int64))
+        with pytest.raises(RuntimeError, match="send"):
+            shared.recv()
+    finally:
+        shared.close()
+
+
+def test_fork_workers_leave_the_blocks_to_the_parent():
+    # In a fresh interpreter the parent has no resource tracker yet when the workers fork. Workers
+    # that tracked their blocks would start their own and unlink the blocks when they exit.
+    script = textwrap.dedent(f"""
+        import sys
+        sys.path[:0] = [{str(CORE_PATH)!r}, {str(Path(__file__).parent)!r}]
+        from SharedBlock import UntrackedBlock
+        from SharedMemoryVecEnv import SharedMemoryVecEnv
+        from test_shared_memory_vec_env import make_counting_env
+
+        if __name__ == "__main__":
+            vec_env = SharedMemoryVecEnv([make_counting_env(0, False)] * 2, start_method="fork")
+            names = list(vec_env.shared.names.values())
+            vec_env.reset()
+            vec_env.close()
+            for name in names:
+                try:
+                    UntrackedBlock(name)
+                    sys.exit(f"{{name}} was not unlinked")
+                except FileNotFoundError:
+                    pass
+    """)
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert "leaked shared_memory" not in result.stderr
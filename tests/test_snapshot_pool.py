@@ -0,0 +1,120 @@
+import pytest
+
+from SnapshotPool import SnapshotPool
+
+
+class FakePyBoy:
+    """save_state / load_state of a single value, enough for the pool"""
+
+    def __init__(self):
+        self.state = 0
+
+    def save_state(self, f):
+        f.write(self.state.to_bytes(4, "little"))
+
+    def load_state(self, f):
+        self.state = int.from_bytes(f.read(4), "little")
+
+
+def test_load_restores_saved_state():
+    pool, pyboy = SnapshotPool(), FakePyBoy()
+    pyboy.state = 7
+    snapshot = pool.save(pyboy)
+    pyboy.state = 8
+    pool.load(pyboy, snapshot)
+    assert pyboy.state == 7
+
+
+def test_overwriting_a_key_keeps_the_held_snapshot_loadable():
+    pool, pyboy = SnapshotPool(), FakePyBoy()
+    pyboy.state = 1
+    held = pool.save(pyboy, "k")
+    pyboy.state = 2
+    newer = pool.save(pyboy, "k")
+
+    pool.load(pyboy, held)
+    assert pyboy.state == 1
+    pool.load(pyboy, newer)
+    assert pyboy.state == 2
+    assert pool.get("k") is newer
+
+
+def test_replaced_snapshot_buffer_is_reused_after_last_release():
+    pool, pyboy = SnapshotPool(), FakePyBoy()
+    held = pool.save(pyboy, "k")
+    buffer = held.buffer
+    pool.save(pyboy, "k")
+    assert pool.free_buffers == []
+
+    held.release()
+    assert pool.free_buffers == [buffer]
+    with pytest.raises(ValueError):
+        pool.load(pyboy, held)
+
+
+def test_eviction_skips_held_snapshots():
+    pool, pyboy = SnapshotPool(max_snapshots=2), FakePyBoy()
+    pyboy.state = 1
+    held = pool.save(pyboy, "held")
+    pool.save(pyboy, "free").release()
+    pyboy.state = 3
+    pool.save(pyboy, "new")
+
+    assert pool.get("free") is None
+    pool.load(pyboy, held)
+    assert pyboy.state == 1
+
+
+def test_full_pool_of_held_snapshots_refuses_to_save():
+    pool, pyboy = SnapshotPool(max_snapshots=2), FakePyBoy()
+    pool.save(pyboy)
+    pool.save(pyboy)
+    with pytest.raises(RuntimeError):
+        pool.save(pyboy)
+
+
+def test_clear_keeps_held_snapshots_loadable():
+    pool, pyboy = SnapshotPool(), FakePyBoy()
+    pyboy.state = 5
+    held = pool.save(pyboy, "k")
+    pool.clear()
+    pyboy.state = 6
+    pool.load(pyboy, held)
+    assert pyboy.state == 5
+
+
+def test_release_more_often_than_acquired_raises():
+    pool, pyboy = SnapshotPool(), FakePyBoy()
+    snapshot = pool.save(pyboy)
+    snapshot.release()
+    with pytest.raises(RuntimeError):
+        snapshot.release()
+
+
+def test_held_detached_snapshots_count_against_the_limit():
+    pool, pyboy = SnapshotPool(max_snapshots=2), FakePyBoy()
+    first = pool.save(pyboy, "k")
+    second = pool.save(pyboy, "k")
+    # The replaced snapshot is still held, so there is no room for a third
+    with pytest.raises(RuntimeError):
+        pool.save(pyboy, "other")
+    assert pool.memory_usage() == first.size() + second.size()
+
+    first.release()
+    pool.save(pyboy, "other")
+    assert len(pool.snapshots) == 2 and pool.detached == set()
+
+
+def test_cleared_held_snapshots_free_their_slot_on_release():
+    pool, pyboy = SnapshotPool(max_snapshots=2), FakePyBoy()
+    held = [pool.save(pyboy), pool.save(pyboy)]
+    pool.clear()
+    assert pool.snapshots == {} and len(pool.detached) == 2
+    with pytest.raises(RuntimeError):
+        pool.save(pyboy)
+
+    held[0].release()
+    pool.save(pyboy).release()
+    # The cached one is evicted for the next, the other held one keeps its slot
+    pool.save(pyboy)
+    assert len(pool.snapshots) == 1 and len(pool.detached) == 1
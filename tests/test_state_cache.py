@@ -0,0 +1,76 @@
+import os
+import subprocess
+import sys
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+
+import pytest
+
+from conftest import CORE_PATH
+from SharedBlock import UntrackedBlock
+from StateCache import StateCache
+
+
+def load_in_worker(key):
+    """load_shared in a separate interpreter, it has its own resource tracker like a worker that was not forked"""
+    return subprocess.run(
+        [sys.executable, "-c", "import sys; from StateCache import StateCache; "
+         f"sys.stdout.buffer.write(StateCache(shared=True).load_shared({key!r}) or b'')"],
+        cwd=CORE_PATH, capture_output=True, check=True,
+    )
+
+
+def test_worker_attach_does_not_unlink_published_state(tmp_path):
+    state_path = tmp_path / f"{uuid.uuid4().hex}.state"
+    state_path.write_bytes(b"save state " * 100)
+    key = os.path.abspath(state_path)
+    StateCache(shared=True).load(state_path)
+    try:
+        first = load_in_worker(key)
+        assert first.stdout == state_path.read_bytes()
+        assert b"leaked shared_memory" not in first.stderr
+        # Still published after the first worker exited
+        assert load_in_worker(key).stdout == state_path.read_bytes()
+    finally:
+        StateCache().unpublish(key)
+        StateCache.blobs.pop(key, None)
+
+
+def test_attach_sends_nothing_to_the_resource_tracker(tmp_path, monkeypatch):
+    # Workers of a vec env share the tracker of the main process, attaching must not change
+    # (or drop) the registration of the worker that published the block
+    state_path = tmp_path / f"{uuid.uuid4().hex}.state"
+    state_path.write_bytes(b"save state")
+    key = os.path.abspath(state_path)
+    StateCache(shared=True).load(state_path)
+    messages = []
+    monkeypatch.setattr(resource_tracker, "register", lambda *args: messages.append(args))
+    monkeypatch.setattr(resource_tracker, "unregister", lambda *args: messages.append(args))
+    try:
+        block = StateCache.attach(StateCache().shm_name(key))
+        block.close()
+        assert messages == []
+    finally:
+        monkeypatch.undo()
+        StateCache().unpublish(key)
+        StateCache.blobs.pop(key, None)
+
+
+def test_untracked_block_reads_the_block_and_leaves_the_tracker_alone(monkeypatch):
+    block = shared_memory.SharedMemory(create=True, size=16)
+    block.buf[:5] = b"state"
+    messages = []
+    monkeypatch.setattr(resource_tracker, "register", lambda *args: messages.append(args))
+    try:
+        attached = UntrackedBlock(block.name)
+        assert (attached.name, attached.size) == (block.name, block.size)
+        assert bytes(attached.buf[:5]) == b"state"
+        attached.close()
+        attached.close()
+        assert messages == []
+    finally:
+        monkeypatch.undo()
+        block.close()
+        block.unlink()
+    with pytest.raises(FileNotFoundError):
+        UntrackedBlock(block.name)
@@ -0,0 +1,111 @@
+import zlib
+
+import numpy as np
+
+from TrajectoryLog import (
+    EPISODE_DTYPE,
+    KeyframeWriter,
+    TrajectoryLogReader,
+    TrajectoryLogWriter,
+    column_file,
+    read_keyframes,
+)
+
+COLUMNS = {"step": ("<i4", ()), "action": ("u1", ()), "levels": ("u1", (6,))}
+
+
+def write_episode(writer, length, first_action=0):
+    for step in range(length):
+        writer.append(step=step, action=(first_action + step) % 7, levels=np.full(6, step % 100))
+
+
+def test_write_read_round_trip(tmp_path):
+    writer = TrajectoryLogWriter(tmp_path, COLUMNS, chunk_steps=4)
+    write_episode(writer, 10)
+    writer.end_episode(seed=1)
+    write_episode(writer, 3, first_action=5)
+    writer.close(seed=2)
+
+    reader = TrajectoryLogReader(tmp_path)
+    assert len(reader) == 13
+    assert reader.episodes.tolist() == [(0, 10, 1), (10, 3, 2)]
+    second = reader.episode(1)
+    assert second["step"].tolist() == [0, 1, 2]
+    assert second["action"].tolist() == [5, 6, 0]
+    assert reader["levels"].shape == (13, 6)
+    assert (reader["levels"][9] == 9).all()
+
+
+def test_rows_are_only_written_in_chunks(tmp_path):
+    writer = TrajectoryLogWriter(tmp_path, COLUMNS, chunk_steps=4)
+    write_episode(writer, 5)
+    assert len(TrajectoryLogReader(tmp_path)) == 4
+    assert writer.next_row == 5
+    writer.close()
+    assert len(TrajectoryLogReader(tmp_path)) == 5
+
+
+def test_reopen_appends(tmp_path):
+    writer = TrajectoryLogWriter(tmp_path, COLUMNS)
+    write_episode(writer, 3)
+    writer.close(seed=1)
+    writer = TrajectoryLogWriter(tmp_path, COLUMNS)
+    write_episode(writer, 2)
+    writer.close(seed=2)
+    assert TrajectoryLogReader(tmp_path).episodes.tolist() == [(0, 3, 1), (3, 2, 2)]
+
+
+def test_reopen_after_cut_off_writes_truncates_columns_and_episodes(tmp_path):
+    writer = TrajectoryLogWriter(tmp_path, COLUMNS)
+    write_episode(writer, 6)
+    writer.end_episode(seed=1)
+    write_episode(writer, 4)
+    writer.close(seed=2)
+    # A crash while writing: the last rows of one column are lost and an episode entry is half written
+    action_file = column_file(tmp_path, "action")
+    action_file.write_bytes(action_file.read_bytes()[:8])
+    with open(tmp_path / "episodes.bin", "ab") as f:
+        f.write(np.array([(10, 1, 3)], dtype=EPISODE_DTYPE).tobytes()[:5])
+
+    reader = TrajectoryLogReader(tmp_path)
+    assert len(reader) == 8
+    assert reader.episodes.tolist() == [(0, 6, 1)]
+
+    writer = TrajectoryLogWriter(tmp_path, COLUMNS)
+    assert writer.steps == 8
+    assert (tmp_path / "episodes.bin").stat().st_size == EPISODE_DTYPE.itemsize
+    write_episode(writer, 2)
+    writer.close(seed=4)
+    reader = TrajectoryLogReader(tmp_path)
+    assert len(reader) == 10
+    assert reader.episodes.tolist() == [(0, 6, 1), (8, 2, 4)]
+    assert column_file(tmp_path, "step").stat().st_size == 10 * 4
+
+
+def test_reopened_keyframes_keep_the_end_checksum_of_the_last_row(tmp_path):
+    keyframes = KeyframeWriter(tmp_path, 0)
+    keyframes.add(0, b"state 0", 1)
+    keyframes.add(4, b"state 4", 2)
+    keyframes.add_checksum(6, 3)
+    keyframes.add(6, b"state 6", 4)
+    keyframes.add_checksum(8, 5)
+
+    # The log only has 6 rows: the checksum after row 5 stays, the keyframes of rows 6 and 8 go
+    keyframes = KeyframeWriter(tmp_path, 6)
+    index = read_keyframes(tmp_path)
+    assert index[["row", "length", "crc"]].tolist() == [
+        (0, len(zlib.compress(b"state 0", 1)), 1),
+        (4, len(zlib.compress(b"state 4", 1)), 2),
+        (6, 0, 3),
+    ]
+    assert keyframes.offset == (tmp_path / "keyframes.blob").stat().st_size
+
+
+def test_open_session(tmp_path):
+    for instance_id in ("a", "b"):
+        writer = TrajectoryLogWriter(tmp_path / "trajectories" / instance_id, COLUMNS)
+        write_episode(writer, 2)
+        writer.close()
+    logs = TrajectoryLogReader.open_session(tmp_path)
+    assert sorted(logs) == ["a", "b"]
+    assert len(logs["b"]) == 2
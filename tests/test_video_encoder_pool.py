@@ -0,0 +1,86 @@
+import mediapy as media
+import numpy as np
+import pytest
+
+from SharedBlock import UntrackedBlock
+from VideoEncoderPool import VideoEncoderPool, VideoStream
+
+SHAPE = (32, 48, 3)
+
+
+def frame(index):
+    return np.full(SHAPE, index * 10 % 256, dtype=np.uint8)
+
+
+@pytest.fixture
+def pool():
+    pool = VideoEncoderPool(num_encoders=2)
+    pool.start()
+    yield pool
+    pool.stop()
+
+
+def test_two_streams_write_their_videos(pool, tmp_path):
+    streams = [VideoStream(pool.addresses[rank % len(pool.addresses)], fps=10) for rank in range(2)]
+    lengths = [12, 7]
+    for rank, (stream, length) in enumerate(zip(streams, lengths)):
+        stream.start(tmp_path / f"env_{rank}.mp4")
+    for index in range(max(lengths)):
+        for stream, length in zip(streams, lengths):
+            if index < length:
+                assert stream.add(frame(index))
+
+    assert [stream.close() for stream in streams] == lengths
+    for rank, length in enumerate(lengths):
+        assert len(media.read_video(tmp_path / f"env_{rank}.mp4")) == length
+    stats = pool.stats()
+    assert (stats["frames"], stats["dropped"], stats["videos"], stats["recording"]) == (19, 0, 2, 0)
+
+
+def test_written_and_dropped_frames_add_up(pool, tmp_path):
+    # A small ring and a burst, the encoder can't keep up and frames are dropped
+    stream = VideoStream(pool.addresses[0], fps=10, slots=4, batch=2)
+    stream.start(tmp_path / "burst.mp4")
+    added = sum(stream.add(frame(index)) for index in range(200))
+    assert added + stream.dropped == 200
+    assert stream.dropped > 0
+
+    assert stream.close() == added == stream.sent
+    assert len(media.read_video(tmp_path / "burst.mp4")) == added
+    stats = pool.stats()
+    assert (stats["frames"], stats["dropped"]) == (added, stream.dropped)
+
+
+def test_videos_reuse_the_connection_and_the_ring(pool, tmp_path):
+    stream = VideoStream(pool.addresses[0], fps=10)
+    for video in range(3):
+        stream.start(tmp_path / f"video_{video}.mp4")
+        for index in range(5):
+            stream.add(frame(index))
+        name = stream.block.name
+    stream.finish()
+    # Started, but without frames: no file
+    stream.start(tmp_path / "empty.mp4")
+    assert stream.close() == 15
+    assert [len(media.read_video(tmp_path / f"video_{video}.mp4")) for video in range(3)] == [5] * 3
+    assert not (tmp_path / "empty.mp4").exists()
+    assert stream.block is None
+    with pytest.raises(FileNotFoundError):
+        UntrackedBlock(name)
+
+
+def test_close_unlinks_the_ring_and_stop_joins_the_encoders(tmp_path):
+    pool = VideoEncoderPool(num_encoders=2)
+    addresses = pool.start()
+    processes = list(pool.processes)
+    stream = VideoStream(addresses[1], fps=10)
+    stream.start(tmp_path / "video.mp4")
+    stream.add(frame(0))
+    name = stream.block.name
+    assert stream.close() == 1
+    with pytest.raises(FileNotFoundError):
+        UntrackedBlock(name)
+
+    pool.stop()
+    assert pool.addresses == [] and pool.processes == []
+    assert [process.exitcode for process in processes] == [0, 0]
@@ -0,0 +1,53 @@
+import json
+import subprocess
+import sys
+import textwrap
+
+import WorkerTemplate
+from conftest import CORE_PATH
+
+
+def test_template_key_ignores_the_per_worker_settings():
+    config = {"gb_path": "a.gb", "max_steps": 8}
+    assert WorkerTemplate.template_key({**config, "rank": 1, "seed": 2, "instance_id": "x"}) == (
+        WorkerTemplate.template_key(config)
+    )
+    assert WorkerTemplate.template_key({**config, "max_steps": 9}) != WorkerTemplate.template_key(config)
+
+
+def test_nothing_is_built_without_a_preloaded_config(env_config, monkeypatch):
+    monkeypatch.setattr(WorkerTemplate, "built", False)
+    monkeypatch.delenv(WorkerTemplate.TEMPLATE_CONFIG_VAR, raising=False)
+    # Importing the module builds nothing, and without a preloaded config neither does take()
+    assert WorkerTemplate.template is None
+    assert WorkerTemplate.take(env_config) is None
+    assert WorkerTemplate.built and WorkerTemplate.template is None
+
+
+def test_forkserver_builds_the_template_and_the_environment_is_restored(env_config, tmp_path):
+    # The forkserver is started once per process, so in a fresh interpreter
+    script = tmp_path / "preload.py"
+    script.write_text(textwrap.dedent(f"""
+        import json, multiprocessing as mp, os, sys
+        sys.path.insert(0, {str(CORE_PATH)!r})
+        import WorkerTemplate
+
+        if __name__ == "__main__":
+            config = json.loads(sys.argv[1])
+            environ = dict(os.environ)
+            WorkerTemplate.preload(config)
+            with mp.get_context("forkserver").Pool(1) as pool:
+                in_worker = pool.apply(eval, ("__import__('WorkerTemplate').template[0]",))
+            print(json.dumps({{
+                "environ_restored": dict(os.environ) == environ,
+                "built_here": WorkerTemplate.built,
+                "worker_key_matches": in_worker == WorkerTemplate.template_key(config),
+            }}))
+    """))
+    config = {**env_config, "session_path": str(env_config["session_path"])}
+    output = subprocess.run(
+        [sys.executable, str(script), json.dumps(config)],
+        capture_output=True, text=True, check=True, timeout=120,
+    ).stdout
+    result = json.loads(output.strip().splitlines()[-1])
+    assert result == {"environ_restored": True, "built_here": False, "worker_key_matches": True}
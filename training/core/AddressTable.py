@@ -0,0 +1,95 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+# Resolved next to this module, so it does not depend on the working directory
+ADDRESSES_FILE = Path(__file__).resolve().parent / "poke_red_addresses.json"
+
+STAT_TYPES = ("int", "string")
+STAT_FIELDS = {
+    "address": int,
+    "length": int,
+    "type": str,
+    "is_poke_stat": bool,
+    "amount": int,
+}
+
+ADDRESS_DTYPE = np.dtype(
+    [
+        ("address", np.uint16),
+        ("length", np.uint8),
+        ("amount", np.uint8),
+        ("is_poke_stat", np.bool_),
+        ("is_string", np.bool_),
+    ]
+)
+
+
+def reject_duplicates(pairs):
+    names = [name for name, _ in pairs]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate stats in {ADDRESSES_FILE}: {sorted(duplicates)}")
+    return dict(pairs)
+
+
+def validate_stat(name, info):
+    for field, field_type in STAT_FIELDS.items():
+        if field not in info:
+            raise ValueError(f"Stat {name} is missing '{field}'")
+        # bool is an int, but an int is no bool
+        if not isinstance(info[field], field_type) or (
+            field_type is int and isinstance(info[field], bool)
+        ):
+            raise ValueError(f"Stat {name} has a non {field_type.__name__} '{field}'")
+    if info["type"] not in STAT_TYPES:
+        raise ValueError(f"Stat {name} has unknown type {info['type']}")
+    if info["length"] < 1 or info["amount"] < 1:
+        raise ValueError(f"Stat {name} needs a positive length and amount")
+    end = info["address"] + info["length"] * info["amount"]
+    if info["address"] < 0 or end > 0x10000:
+        raise ValueError(f"Stat {name} is outside of the address space")
+
+
+def load_addresses(path=ADDRESSES_FILE):
+    with open(path, "r") as f:
+        stats = json.load(f, object_pairs_hook=reject_duplicates)
+    for name, info in stats.items():
+        validate_stat(name, info)
+    return stats
+
+
+def compile_table(stats):
+    """Address map as a structured array, row i belongs to the stat with id i"""
+    return np.array(
+        [
+            (
+                info["address"],
+                info["length"],
+                info["amount"],
+                info["is_poke_stat"],
+                info["type"] == "string",
+            )
+            for info in stats.values()
+        ],
+        dtype=ADDRESS_DTYPE,
+    )
+
+
+STATS = load_addresses()
+STAT_NAMES = list(STATS)
+STAT_IDS = {name: stat_id for stat_id, name in enumerate(STAT_NAMES)}
+ADDRESS_TABLE = compile_table(STATS)
+# Same rows as plain tuples, indexing these is faster than numpy scalars in python code
+ADDRESS_ROWS = ADDRESS_TABLE.tolist()
+
+__all__ = [
+    "ADDRESSES_FILE",
+    "ADDRESS_ROWS",
+    "ADDRESS_TABLE",
+    "STATS",
+    "STAT_IDS",
+    "STAT_NAMES",
+    "load_addresses",
+]
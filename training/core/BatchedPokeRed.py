@@ -0,0 +1,82 @@
+import numpy as np
+
+from PokeRed import PokeRed
+
+
+class BatchedPokeRed:
+    """Several emulators stepped together in one process.
+
+    A step runs one action on every emulator and writes their stats and screens
+    into preallocated stacked arrays: `stats` has one row per emulator with the
+    decoded values of its RamSnapshot (see `stat_columns`), `events` the event
+    counts and `frames` the screens. BatchedVecEnv steps the emulators of its
+    envs with one.
+    """
+
+    SCREEN_SHAPE = (144, 160, 4)
+
+    def __init__(self, gb_path, num_emulators, state_file=None, **poke_red_kwargs):
+        self.setup([
+            PokeRed(gb_path, state_file=state_file, hide_window=True, **poke_red_kwargs)
+            for _ in range(num_emulators)
+        ])
+
+    @classmethod
+    def from_emulators(cls, emulators):
+        """Batch PokeRed instances that already exist, like the ones of envs"""
+        batched = cls.__new__(cls)
+        batched.setup(list(emulators))
+        return batched
+
+    def setup(self, emulators):
+        if not emulators:
+            raise ValueError("BatchedPokeRed needs at least one emulator")
+        self.emulators = emulators
+        self.num_emulators = num_emulators = len(emulators)
+        self.layout = self.emulators[0].stat_snapshot.layout
+
+        value_count = len(self.emulators[0].stat_snapshot.values)
+        self.stats = np.zeros((num_emulators, value_count), dtype=np.int64)
+        self.events = np.zeros(num_emulators, dtype=np.int64)
+        self.frames = np.zeros((num_emulators, *self.SCREEN_SHAPE), dtype=np.uint8)
+
+    def load_from_state(self, state_file, indices=None):
+        """Load a state (path or bytes) into all, or the given, emulators and refresh their buffers"""
+        indices = range(self.num_emulators) if indices is None else indices
+        for i in indices:
+            self.emulators[i].load_from_state(state_file)
+            self.read(i)
+
+    def step(self, actions):
+        """Run one action on every emulator, returns the stacked stats and screens"""
+        if len(actions) != self.num_emulators:
+            raise ValueError(f"{len(actions)} actions for {self.num_emulators} emulators")
+        for i, action in enumerate(actions):
+            self.emulators[i].run_action(action)
+            self.read(i)
+        return self.stats, self.frames
+
+    def read(self, i):
+        emulator = self.emulators[i]
+        self.stats[i] = emulator.stat_snapshot.read(emulator.pyboy.memory)
+        self.events[i] = emulator.read_event_count()
+        self.frames[i] = emulator.get_screen()
+
+    def stat_columns(self, name):
+        """View of the stacked values of one stat, shape (emulators, values)"""
+        row, count, _ = self.layout[name]
+        return self.stats[:, row : row + count]
+
+    def hp_fractions(self):
+        return self.stat_columns("HP").sum(axis=1) / self.stat_columns("Max HP").sum(axis=1)
+
+    def stats_dict(self, i):
+        """The stats of one emulator as returned by PokeRed.get_all_stats"""
+        emulator = self.emulators[i]
+        all_stats = emulator.stat_snapshot.to_dict()
+        all_stats["Relative HP"] = sum(all_stats["HP"]) / sum(all_stats["Max HP"])
+        all_stats["Events"] = int(self.events[i])
+        return all_stats
+
+
+__all__ = ["BatchedPokeRed"]
@@ -0,0 +1,49 @@
+from copy import deepcopy
+
+import numpy as np
+from stable_baselines3.common.vec_env import DummyVecEnv
+
+from BatchedPokeRed import BatchedPokeRed
+
+
+class BatchedVecEnv(DummyVecEnv):
+    """Drop-in for DummyVecEnv that runs all RedGymEnvs in this process on one BatchedPokeRed.
+
+    A step runs the action of every env on its emulator with one
+    BatchedPokeRed.step, then finishes the step of every env with the stats
+    and screen the batch read. No pipes or pickling, so several emulators per
+    process are cheaper than one process per emulator. The step timings of
+    an env cover the emulation of the whole batch.
+    """
+
+    def __init__(self, env_fns):
+        super().__init__(env_fns)
+        self.red_envs = [env.unwrapped for env in self.envs]
+        self.emulators = BatchedPokeRed.from_emulators([env.poke_red for env in self.red_envs])
+
+    def step_wait(self):
+        for env in self.red_envs:
+            env.start_step()
+        self.emulators.step(self.actions)
+        for env_idx, env in enumerate(self.red_envs):
+            obs, self.buf_rews[env_idx], terminated, truncated, self.buf_infos[env_idx] = env.finish_step(
+                self.actions[env_idx],
+                self.emulators.stats_dict(env_idx),
+                self.emulators.frames[env_idx],
+            )
+            # The rest like DummyVecEnv.step_wait
+            self.buf_dones[env_idx] = terminated or truncated
+            self.buf_infos[env_idx]["TimeLimit.truncated"] = truncated and not terminated
+            if self.buf_dones[env_idx]:
+                self.buf_infos[env_idx]["terminal_observation"] = obs
+                obs, self.reset_infos[env_idx] = self.envs[env_idx].reset()
+            self._save_obs(env_idx, obs)
+        return (
+            self._obs_from_buf(),
+            np.copy(self.buf_rews),
+            np.copy(self.buf_dones),
+            deepcopy(self.buf_infos),
+        )
+
+
+__all__ = ["BatchedVecEnv"]
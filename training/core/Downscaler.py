@@ -0,0 +1,41 @@
+import numpy as np
+
+
+class Downscaler:
+    """Exact block mean downscaling of the first channel of a uint8 frame.
+
+    144x160 to 36x40 is a 4x4 reduction, so every output pixel is the rounded
+    mean of one 4x4 block. This is done with integer sums into preallocated
+    buffers, there is no filtering or float interpolation.
+    """
+
+    def __init__(self, in_shape=(144, 160), factor=4):
+        height, width = in_shape[:2]
+        if factor < 2 or height % factor or width % factor:
+            raise ValueError(f"{in_shape} can not be reduced by {factor}")
+        self.factor = factor
+        self.out_shape = (height // factor, width // factor, 1)
+        self.row_sums = np.zeros((height // factor, width), dtype=np.uint16)
+        self.sums = np.zeros(self.out_shape[:2], dtype=np.uint16)
+        self.out = np.zeros(self.out_shape, dtype=np.uint8)
+
+    def downscale(self, frame, out=None):
+        """Downscale frame[:, :, 0] into out (default: a buffer reused every call)"""
+        out = self.out if out is None else out
+        channel = frame[:, :, 0] if frame.ndim == 3 else frame
+        f = self.factor
+        # Strided adds are much faster than a sum over the axes of a reshaped view
+        np.add(channel[0::f], channel[1::f], out=self.row_sums, dtype=np.uint16)
+        for i in range(2, f):
+            self.row_sums += channel[i::f]
+        np.add(self.row_sums[:, 0::f], self.row_sums[:, 1::f], out=self.sums)
+        for i in range(2, f):
+            self.sums += self.row_sums[:, i::f]
+        # Round to nearest, then divide by the block size
+        self.sums += self.factor * self.factor // 2
+        self.sums //= self.factor * self.factor
+        out[:, :, 0] = self.sums
+        return out
+
+
+__all__ = ["Downscaler"]
@@ -2,9 +2,9 @@ from math import floor
 
 import numpy as np
 from ConfigToAttr import apply_dict_as_attributes
+from Downscaler import Downscaler
 from gymnasium import spaces
 from PokeRed import PokeRed
-from skimage.transform import resize
 
 
 class EnvInputConstructor:
@@ -22,26 +22,75 @@ class EnvInputConstructor:
         ),
     }
 
+    # Stats vector of the dict observation: (stat, values) in order, hp is scaled to 0-255
+    STATS_LAYOUT = (
+        ("Party", 6),
+        ("Level", 6),
+        ("HP", 6),
+        ("Badges", 1),
+        ("Map", 1),
+        ("Party Count", 1),
+    )
+    STATS_SHAPE = (sum(count for _, count in STATS_LAYOUT),)
+    STATS_SPACE = spaces.Box(low=0, high=255, shape=STATS_SHAPE, dtype=np.uint8)
+
     def __init__(self):
         apply_dict_as_attributes(self, self.ENV_CONFIG)
-        self.pad = np.zeros(
-            shape=(self.mem_padding, self.combined_shape[1], 1), dtype=np.uint8
-        )
+        self.downscaler = Downscaler()
 
-    def render_for_ml(self, stats, frame, last_rewards):
-        formatted_rewards = {k: f"{v:3.2f}" if (isinstance(v, float) or isinstance(v, int)) else v for k, v in last_rewards.items()}
-        #print(f"Last Rewards: {formatted_rewards}", flush=True)
-        rendered_frame = self.scale_frame(frame)
-        rendered_infobars = self.get_infobars(last_rewards)
-        full_ml_image = np.concatenate(
-            (rendered_infobars, self.pad, rendered_frame), axis=0
-        )
-        return full_ml_image
+        # The observation is written in place: info bars, padding (always 0), frame
+        self.observation = np.zeros(self.combined_shape, dtype=np.uint8)
+        self.frame_view = self.observation[self.mem_height + self.mem_padding :]
+        self.infobar_key = None
+
+    def render_for_ml(self, stats, scaled_frame, last_rewards):
+        """scaled_frame is the already downscaled screen, see scale_frame.
+        Returns a buffer that is overwritten every call, copy it to keep it."""
+        # The bars only change when one of their (floored) inputs does
+        infobar_key = self.get_infobar_key(last_rewards)
+        if infobar_key != self.infobar_key:
+            self.observation[: self.mem_height] = self.get_infobars(last_rewards)
+            self.infobar_key = infobar_key
+        if scaled_frame is not self.frame_view:
+            self.frame_view[:] = scaled_frame
+        return self.observation
+
+    def setup_stats(self, layout):
+        """Gather rows of the stats vector in the values of a RamSnapshot with this layout"""
+
+        def rows(name):
+            row, count, _ = layout[name]
+            return list(range(row, row + count))
+
+        gather = []
+        for name, _ in self.STATS_LAYOUT:
+            # HP is gathered too, then overwritten with the fraction of max HP
+            gather += rows(name)
+        self.stats_gather = np.array(gather, dtype=np.intp)
+        hp_start = self.STATS_LAYOUT[0][1] + self.STATS_LAYOUT[1][1]
+        self.hp_slice = slice(hp_start, hp_start + 6)
+        self.max_hp_gather = np.array(rows("Max HP"), dtype=np.intp)
+
+        self.stats_values = np.zeros(self.STATS_SHAPE, dtype=np.int64)
+        self.max_hp = np.zeros(6, dtype=np.int64)
+        self.stats = np.zeros(self.STATS_SHAPE, dtype=np.uint8)
+
+    def render_stats(self, values):
+        """Stats vector for the dict observation, straight from RamSnapshot.values.
+        Returns a buffer that is overwritten every call, copy it to keep it."""
+        np.take(values, self.stats_gather, out=self.stats_values)
+        np.take(values, self.max_hp_gather, out=self.max_hp)
+        hp = self.stats_values[self.hp_slice]
+        hp *= 255
+        np.maximum(self.max_hp, 1, out=self.max_hp)
+        hp //= self.max_hp
+        np.clip(self.stats_values, 0, 255, out=self.stats_values)
+        self.stats[:] = self.stats_values
+        return self.stats
 
-    def scale_frame(self, frame, resolution=(36, 40)):
-        scaled = (255 * resize(frame, resolution, anti_aliasing=True)).astype(np.uint8)
-        scaled = scaled[:, :, :1]
-        return scaled
+    def scale_frame(self, frame):
+        """(36, 40, 1) block mean of the first channel, written straight into the observation"""
+        return self.downscaler.downscale(frame, out=self.frame_view)
 
     def get_infobars(self, last_rewards):
         info_bars = self.create_info_bars(
@@ -49,10 +98,14 @@ class EnvInputConstructor:
         )
         return info_bars
 
-    def create_info_bars(self, progress_reward, w, h, col_steps):
-        bar_height = h // 3
-        remainder = h % 3
+    def get_infobar_key(self, progress_reward):
+        """The rendered bars only depend on the floor of each value"""
+        level, hp, explore, badges = self.get_infobar_values(
+            progress_reward, self.combined_shape[1]
+        )
+        return floor(level), floor(hp), floor(explore), badges > 0
 
+    def get_infobar_values(self, progress_reward, w):
         level = (
             min(progress_reward["level"] * 100, w) if "level" in progress_reward else 0
         )
@@ -63,6 +116,13 @@ class EnvInputConstructor:
             else 0
         )
         badges = progress_reward["badge"] if "badge" in progress_reward else 0
+        return level, hp, explore, badges
+
+    def create_info_bars(self, progress_reward, w, h, col_steps):
+        bar_height = h // 3
+        remainder = h % 3
+
+        level, hp, explore, badges = self.get_infobar_values(progress_reward, w)
 
         level_bar = self.make_reward_channel(level, w, bar_height, col_steps)
         hp_bar = self.make_reward_channel(hp, w, bar_height, col_steps)
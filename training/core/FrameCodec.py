@@ -0,0 +1,96 @@
+import numpy as np
+
+# Shades of the default PyBoy palette, index 0 is white
+PALETTE = np.array([255, 153, 85, 0], dtype=np.uint8)
+PALETTE_RGBA = np.concatenate(
+    [np.repeat(PALETTE[:, None], 3, axis=1), np.full((4, 1), 255, dtype=np.uint8)], axis=1
+)
+# Palette index of every value of the first channel, other values get the nearest shade
+SHADE_INDEX = np.abs(
+    np.arange(256, dtype=np.int16)[:, None] - PALETTE[None, :].astype(np.int16)
+).argmin(axis=1).astype(np.uint8)
+
+SCREEN_SHAPE = (144, 160)
+# 4 pixels of 2 bits per byte
+PACKED_SHAPE = (SCREEN_SHAPE[0], SCREEN_SHAPE[1] // 4)
+
+
+def is_packed(frame):
+    return frame.ndim == 2 and frame.shape == PACKED_SHAPE and frame.dtype == np.uint8
+
+
+def pack_frame(frame, out=None):
+    """Palette indices of an RGBA (or single channel) screen, 4 pixels per byte.
+
+    The first pixel of every 4 is in the lowest 2 bits. 144x160x4 bytes become
+    144x40, 16 times less.
+    """
+    channel = frame[:, :, 0] if frame.ndim == 3 else frame
+    indices = np.take(SHADE_INDEX, channel)
+    out = np.empty(PACKED_SHAPE, dtype=np.uint8) if out is None else out
+    np.left_shift(indices[:, 3::4], 6, out=out)
+    out |= indices[:, 2::4] << 4
+    out |= indices[:, 1::4] << 2
+    out |= indices[:, 0::4]
+    return out
+
+
+def unpack_frame(packed, out=None):
+    """Palette indices (144, 160) of a packed frame"""
+    out = np.empty(SCREEN_SHAPE, dtype=np.uint8) if out is None else out
+    for i in range(4):
+        np.right_shift(packed, 2 * i, out=out[:, i::4])
+        out[:, i::4] &= 3
+    return out
+
+
+def decode_frame(packed, channels=4):
+    """The screen of a packed frame: RGBA like PyBoy (channels=4), or one gray channel (channels=1)"""
+    indices = unpack_frame(packed)
+    if channels == 1:
+        return PALETTE[indices][:, :, None]
+    return PALETTE_RGBA[indices]
+
+
+class FrameDelta:
+    """Delta coding of a sequence of packed frames against the previous frame.
+
+    encode() returns (is_keyframe, data): every `keyframe_interval` frames the
+    frame itself, otherwise the XOR with the previous frame, which is mostly
+    zeros and compresses well. decode() undoes it, with one instance per
+    sequence on each side.
+    """
+
+    def __init__(self, keyframe_interval=64):
+        self.keyframe_interval = keyframe_interval
+        self.previous = np.zeros(PACKED_SHAPE, dtype=np.uint8)
+        self.count = 0
+
+    def reset(self):
+        self.count = 0
+
+    def encode(self, packed):
+        keyframe = self.count % self.keyframe_interval == 0
+        data = packed.copy() if keyframe else np.bitwise_xor(packed, self.previous)
+        self.previous[:] = packed
+        self.count += 1
+        return keyframe, data
+
+    def decode(self, keyframe, data):
+        if keyframe:
+            self.previous[:] = data
+        else:
+            self.previous ^= data
+        self.count += 1
+        return self.previous.copy()
+
+
+__all__ = [
+    "FrameDelta",
+    "PACKED_SHAPE",
+    "PALETTE",
+    "decode_frame",
+    "is_packed",
+    "pack_frame",
+    "unpack_frame",
+]
@@ -0,0 +1,42 @@
+import numpy as np
+
+
+class FrameStack:
+    """The last `stacks` observations along the channel axis, oldest first (like VecFrameStack).
+
+    Each frame is written twice into a ring of 2 * stacks slots, so the current
+    stack is always one channel slice of the buffer: a push writes one frame
+    twice instead of shifting all of them. The slice is a strided view, not a
+    contiguous array, the vec envs copy it into their observation buffers anyway.
+    """
+
+    def __init__(self, frame_shape, stacks):
+        height, width, channels = frame_shape
+        self.stacks = stacks
+        self.channels = channels
+        self.shape = (height, width, channels * stacks)
+        self.buffer = np.zeros((height, width, channels * stacks * 2), dtype=np.uint8)
+        self.position = 0
+
+    def reset(self, frame):
+        """Start a new episode, like VecFrameStack the older frames are zeros"""
+        self.buffer[:] = 0
+        self.position = 0
+        return self.push(frame)
+
+    def push(self, frame):
+        """Add the newest frame, returns a view of the stack (valid until the next push)"""
+        c = self.channels
+        first = self.position * c
+        second = (self.position + self.stacks) * c
+        self.buffer[:, :, first : first + c] = frame
+        self.buffer[:, :, second : second + c] = frame
+        self.position = (self.position + 1) % self.stacks
+        return self.view()
+
+    def view(self):
+        start = self.position * self.channels
+        return self.buffer[:, :, start : start + self.stacks * self.channels]
+
+
+__all__ = ["FrameStack"]
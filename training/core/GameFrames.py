@@ -0,0 +1,26 @@
+import numpy as np
+
+from FrameCodec import PALETTE_RGBA, SCREEN_SHAPE
+
+TILE_SIZE = 8
+
+
+def game_like_frames(count, seed, flat_fraction=0.7):
+    """RGBA frames made of 8x8 tiles of the 4 palette shades, like the Game Boy screen.
+
+    Most tiles are one flat shade (floors and walls), the rest have random detail.
+    For benchmarks and tests that run without the game.
+    """
+    rng = np.random.default_rng(seed)
+    rows, cols = SCREEN_SHAPE[0] // TILE_SIZE, SCREEN_SHAPE[1] // TILE_SIZE
+    frames = []
+    for _ in range(count):
+        tiles = rng.integers(0, 4, size=(rows, cols, TILE_SIZE, TILE_SIZE))
+        flat = rng.random((rows, cols)) < flat_fraction
+        tiles[flat] = tiles[flat][:, :1, :1]
+        indices = tiles.transpose(0, 2, 1, 3).reshape(SCREEN_SHAPE)
+        frames.append(PALETTE_RGBA[indices])
+    return frames
+
+
+__all__ = ["game_like_frames"]
@@ -3,15 +3,53 @@ import numpy as np
 
 
 class KnnHandler:
-    def __init__(self, num_elements=20000, vec_dim=4320, sim_frame_dist=2000000):
+    """Counts novel frames with an hnswlib index that can be cleared and reused across episodes.
+
+    When the index is full it either grows (up to max_elements) or evicts its
+    oldest frames, depending on capacity_policy. Evicted frames are only marked
+    deleted, their slots are reused by the next inserts.
+
+    clear() with clear_policy "reuse" keeps the index and its memory: all
+    frames are marked deleted like evicted ones, and the labels go on. With
+    "rebuild" it starts a new index with the capacity the old one grew to.
+    Inserts into the slots of deleted frames are slower (hnswlib repairs the
+    graph around them), so rebuild is faster when episodes find many frames.
+    """
+
+    CAPACITY_POLICIES = ("grow", "evict")
+    CLEAR_POLICIES = ("reuse", "rebuild")
+
+    def __init__(
+        self,
+        num_elements=20000,
+        vec_dim=4320,
+        sim_frame_dist=2000000,
+        capacity_policy="grow",
+        max_elements=40000,
+        growth_factor=2,
+        clear_policy="reuse",
+    ):
         #print(f"Creating knn index with {num_elements} elements, {vec_dim} dimensions")
+        if capacity_policy not in self.CAPACITY_POLICIES:
+            raise ValueError(f"Unknown capacity policy {capacity_policy}")
+        if clear_policy not in self.CLEAR_POLICIES:
+            raise ValueError(f"Unknown clear policy {clear_policy}")
         self.num_elements = num_elements
         self.vec_dim = vec_dim
+        self.capacity_policy = capacity_policy
+        self.max_elements = max(max_elements, num_elements)
+        self.growth_factor = growth_factor
+        self.clear_policy = clear_policy
 
         self.base_explore = 0
         self.sim_frame_dist = sim_frame_dist
 
+        # Novel frames since the last clear, evictions don't lower it
         self.count = 0
+        # Labels of the frames in the index are oldest_label ... next_label - 1
+        self.oldest_label = 0
+        self.next_label = 0
+        self.deleted = 0
 
         self.knn_index = self.create_index()
 
@@ -19,53 +57,79 @@ class KnnHandler:
         new_index = hnswlib.Index(
             space="l2", dim=self.vec_dim
         )  # possible options are l2, cosine or ip
-        new_index.init_index(max_elements=self.num_elements, ef_construction=100, M=16)
+        new_index.init_index(
+            max_elements=self.num_elements,
+            ef_construction=100,
+            M=16,
+            allow_replace_deleted=True,
+        )
         return new_index
 
+    def clear(self):
+        """Forget all frames, see clear_policy"""
+        if self.clear_policy == "rebuild":
+            self.knn_index = self.create_index()
+            self.oldest_label = 0
+            self.next_label = 0
+            self.deleted = 0
+        else:
+            for label in range(self.oldest_label, self.next_label):
+                self.knn_index.mark_deleted(label)
+            self.deleted += self.number_of_frames()
+            self.oldest_label = self.next_label
+        self.count = 0
+
     def is_frame_novel(self, vec):
-        if self.count == 0:
+        if self.number_of_frames() == 0:
             #print("adding first frame to knn index")
             return True
         else:
             flat = vec.flatten().astype(np.float32)
-            return self.knn_index.knn_query(flat, k=1)[1][0] > self.sim_frame_dist
+            return self.nearest_distance(flat) > self.sim_frame_dist
+
+    def nearest_distance(self, flat):
+        """Squared L2 distance to the nearest frame in the index"""
+        try:
+            return self.knn_index.knn_query(flat, k=1)[1][0]
+        except RuntimeError:
+            # Deleted frames can cut the graph search off from the live ones, compare with all of them
+            live = self.knn_index.get_items(list(range(self.oldest_label, self.next_label)))
+            return float(np.square(live - flat).sum(axis=1).min())
 
     def update_frame_knn_index(self, frame_vec):
-        if self.is_frame_novel(frame_vec):
-            new_frame_id = self.count
-            identifiers = np.array([new_frame_id])
-            self.knn_index.add_items(
-                frame_vec.flatten().astype(np.float32), identifiers
+        """Add the frame if it is novel, returns whether it was"""
+        if not self.is_frame_novel(frame_vec):
+            return False
+        self.ensure_capacity()
+        identifiers = np.array([self.next_label])
+        self.knn_index.add_items(
+            frame_vec.flatten().astype(np.float32), identifiers, replace_deleted=True
+        )
+        self.next_label += 1
+        if self.deleted > 0:
+            self.deleted -= 1
+        self.count += 1
+        return True
+
+    def ensure_capacity(self):
+        """Make room for one more frame if no deleted slot can be reused"""
+        if self.deleted > 0 or self.knn_index.get_current_count() < self.num_elements:
+            return
+        if self.capacity_policy == "grow" and self.num_elements < self.max_elements:
+            self.num_elements = min(
+                self.max_elements, int(self.num_elements * self.growth_factor)
             )
-            self.count += 1
+            self.knn_index.resize_index(self.num_elements)
+            return
+        # Evicting, or growing but at max_elements already
+        self.knn_index.mark_deleted(self.oldest_label)
+        self.oldest_label += 1
+        self.deleted += 1
 
     def number_of_frames(self):
-        return self.knn_index.get_current_count()
+        return self.next_label - self.oldest_label
 
     def correct_count(self):
-        correct = self.knn_index.get_current_count()
-        if correct != self.count:
-            print(f"count is {self.count} but knn index says {correct}")
-        self.count = correct
-
-    """
-    TODO: Check if this is still needed
-
-    def get_all_events_reward(self):
-        # adds up all event flags, exclude museum ticket
-        event_flags_start = 0xD747
-        event_flags_end = 0xD886
-        museum_ticket = (0xD754, 0)
-        base_event_flags = 13
-        return max(
-            sum(
-                [
-                    self.bit_count(self.read_m(i))
-                    for i in range(event_flags_start, event_flags_end)
-                ]
-            )
-            - base_event_flags
-            - int(self.read_bit(museum_ticket[0], museum_ticket[1])),
-        0,
-    )
-    """
+        correct = self.knn_index.get_current_count() - self.deleted
+        if correct != self.number_of_frames():
+            print(f"count is {self.number_of_frames()} but knn index says {correct}")
@@ -0,0 +1,66 @@
+import bisect
+import math
+
+import numpy as np
+
+
+class LatencyHistogram:
+    """Durations counted in fixed log spaced bins, so memory does not grow with the number of samples.
+
+    Bin 0 counts durations below min_seconds and the last bin those above
+    max_seconds. Quantiles are the upper edge of the bin they fall into (at most the max).
+    """
+
+    def __init__(self, min_seconds=1e-5, max_seconds=10.0, bins_per_decade=10):
+        if not 0 < min_seconds < max_seconds:
+            raise ValueError(f"Invalid range {min_seconds} to {max_seconds}")
+        bins = math.ceil(math.log10(max_seconds / min_seconds) * bins_per_decade)
+        # A list, bisect on it is faster than np.searchsorted for single values
+        self.edges = np.logspace(
+            math.log10(min_seconds), math.log10(max_seconds), bins + 1
+        ).tolist()
+        self.counts = np.zeros(bins + 2, dtype=np.int64)
+        self.reset()
+
+    def reset(self):
+        self.counts[:] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.counts[bisect.bisect_right(self.edges, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        if self.count == 0:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.counts), q * self.count))
+        if index == 0:
+            return self.edges[0]
+        if index > len(self.edges) - 1:
+            return self.max
+        return min(self.edges[index], self.max)
+
+    def summary(self):
+        """Count, mean, max and quantiles in seconds"""
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+__all__ = ["LatencyHistogram"]
@@ -0,0 +1,154 @@
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing.connection import Client, Listener, wait
+
+import numpy as np
+
+from KnnHandler import KnnHandler
+
+DEFAULT_AUTHKEY = b"pokered-novelty"
+
+
+def serve(ready, address, authkey, knn_config):
+    """Server loop: one KnnHandler answering novelty requests of all connected workers"""
+    listener = Listener(address, authkey=authkey)
+    ready.send(listener.address)
+    ready.close()
+
+    knn_handler = KnnHandler(**knn_config)
+    connections = []
+    lock = threading.Lock()
+
+    def accept():
+        while True:
+            try:
+                connection = listener.accept()
+            except OSError:
+                return
+            with lock:
+                connections.append(connection)
+
+    threading.Thread(target=accept, daemon=True).start()
+
+    while True:
+        with lock:
+            current = list(connections)
+        for connection in wait(current, timeout=0.05) if current else []:
+            try:
+                command, data = connection.recv()
+            except (EOFError, OSError):
+                command, data = "close", None
+
+            if command == "submit":
+                verdicts = np.array(
+                    [knn_handler.update_frame_knn_index(vec) for vec in data], dtype=bool
+                )
+                connection.send(verdicts)
+            elif command == "stats":
+                connection.send(
+                    {
+                        "frames": knn_handler.number_of_frames(),
+                        "count": knn_handler.count,
+                        "capacity": knn_handler.num_elements,
+                        "workers": len(current),
+                    }
+                )
+            elif command == "clear":
+                knn_handler.clear()
+                connection.send(True)
+            elif command == "close":
+                connection.close()
+                with lock:
+                    connections.remove(connection)
+            elif command == "shutdown":
+                connection.send(True)
+                listener.close()
+                return
+        if not current:
+            time.sleep(0.05)
+
+
+class NoveltyServer:
+    """Host wide frame novelty archive, shared by all rollout workers.
+
+    The index lives in a separate process. Workers talk to it with a
+    NoveltyClient, so the address (and authkey) is all that needs to be passed
+    to them. Binding to port 0 picks a free port, see `address` after start().
+    """
+
+    def __init__(
+        self,
+        vec_dim=1440,
+        sim_frame_dist=2000000,
+        num_elements=20000,
+        capacity_policy="grow",
+        max_elements=40000,
+        address=("localhost", 0),
+        authkey=DEFAULT_AUTHKEY,
+    ):
+        self.knn_config = {
+            "vec_dim": vec_dim,
+            "sim_frame_dist": sim_frame_dist,
+            "num_elements": num_elements,
+            "capacity_policy": capacity_policy,
+            "max_elements": max_elements,
+        }
+        self.address = address
+        self.authkey = authkey
+        self.process = None
+
+    def start(self):
+        ctx = mp.get_context("spawn")
+        ready, child_ready = ctx.Pipe(duplex=False)
+        self.process = ctx.Process(
+            target=serve,
+            args=(child_ready, self.address, self.authkey, self.knn_config),
+            daemon=True,
+        )
+        self.process.start()
+        child_ready.close()
+        self.address = ready.recv()
+        return self.address
+
+    def stop(self):
+        if self.process and self.process.is_alive():
+            client = NoveltyClient(self.address, self.authkey)
+            client.request("shutdown")
+            client.connection.close()
+            self.process.join()
+        self.process = None
+
+
+class NoveltyClient:
+    """Connection of one worker to a NoveltyServer, opened on first use"""
+
+    def __init__(self, address, authkey=DEFAULT_AUTHKEY):
+        self.address = address
+        self.authkey = authkey
+        self.connection = None
+
+    def request(self, command, data=None):
+        if self.connection is None:
+            self.connection = Client(self.address, authkey=self.authkey)
+        self.connection.send((command, data))
+        return self.connection.recv()
+
+    def submit(self, vecs):
+        """Novelty verdict for each frame vector, novel ones are added to the shared index"""
+        return self.request("submit", np.asarray(vecs, dtype=np.uint8))
+
+    def stats(self):
+        return self.request("stats")
+
+    def clear(self):
+        return self.request("clear")
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.send(("close", None))
+            self.connection.close()
+            self.connection = None
+
+
+__all__ = ["NoveltyClient", "NoveltyServer"]
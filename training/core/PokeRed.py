@@ -1,13 +1,21 @@
+import io
 import json
+import zlib
 import numpy as np
 
 from pyboy import PyBoy
 from pyboy.utils import WindowEvent
-
-ADDRESSES_FILE = "../core/poke_red_addresses.json"
+from AddressTable import ADDRESS_ROWS, STAT_IDS, STATS
+from FrameCodec import pack_frame
+from RamSnapshot import RamSnapshot
+from SnapshotPool import SnapshotPool
 
 class PokeRed:
 
+    # Validated address map, compiled once at import by AddressTable
+    STATS = STATS
+    STAT_IDS = STAT_IDS
+
     POKEMON_OFFSET = 0x002C
     OPPONENT_OFFSET = 0x0739
 
@@ -32,6 +40,21 @@ class PokeRed:
 #        WindowEvent.RELEASE_BUTTON_START,
     ]
 
+    # Event flags, excluding the museum ticket and the flags already set at the start
+    EVENT_FLAGS_START = 0xD747
+    EVENT_FLAGS_END = 0xD886
+    MUSEUM_TICKET = (0xD754, 0)
+    BASE_EVENT_FLAGS = 13
+    # Number of set bits of every byte value
+    BIT_COUNTS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1)
+
+    # Work RAM, the state of the game the replay checksums compare
+    WRAM_START = 0xC000
+    WRAM_END = 0xE000
+
+    # Buttons are held for this many frames of an action before being released
+    RELEASE_FRAME = 8
+
     def __init__(
         self,
         gb_path,
@@ -39,18 +62,33 @@ class PokeRed:
         head="headless",
         hide_window=False,
         tick_callback=None,
+        fast_ticks=True,
+        max_snapshots=32,
+        debug=False,
     ):
-        
-        with open(ADDRESSES_FILE, "r") as f:
-            self.STATS = json.load(f)
+        self.stat_snapshot = RamSnapshot(self.STATS, self.POKEMON_OFFSET)
+        self.opponent_snapshot = None
+        self.event_flags = np.zeros(
+            self.EVENT_FLAGS_END - self.EVENT_FLAGS_START, dtype=np.uint8
+        )
         
         self.pyboy = PyBoy(
             gb_path,
             window = "null" if hide_window else "SDL2",  # Use "null" for headless mode
         )
 
+        # Read only view of the framebuffer, PyBoy renders into it in place.
+        # Every consumer gets this same view, with debug on we check nobody wrote to it.
+        self.screen = self.pyboy.screen.ndarray.view()
+        self.screen.flags.writeable = False
+        self.debug = debug
+        self.screen_checksum = None
+
         self.action_freq = 24
         self.tick_callback = tick_callback
+        # Only render the last frame of an action, it's the only one we read
+        self.fast_ticks = fast_ticks
+        self.snapshots = SnapshotPool(max_snapshots)
 
         if not head == "headless":
             self.pyboy.set_emulation_speed(6)
@@ -59,12 +97,37 @@ class PokeRed:
             self.load_from_state(state_file)
 
     def load_from_state(self, state_file):
+        """Load a save state from a file path, or from the bytes of one (see StateCache)"""
+        if isinstance(state_file, (bytes, bytearray, memoryview)):
+            self.pyboy.load_state(io.BytesIO(state_file))
+            return
         with open(state_file, "rb") as f:
             self.pyboy.load_state(f)
             #print(f"Loaded state from {state_file}")
 
+    def save_state(self):
+        """The emulator state as bytes, load_from_state accepts them"""
+        buffer = io.BytesIO()
+        self.pyboy.save_state(buffer)
+        return buffer.getvalue()
+
+    def ram_checksum(self):
+        """crc32 of the work RAM, equal states of the game have equal checksums"""
+        return zlib.crc32(bytes(self.pyboy.memory[self.WRAM_START : self.WRAM_END]))
+
+    def snapshot(self, key=None):
+        """Save the emulator into an in memory snapshot, call release() on it when done.
+        Snapshots saved with a key can be fetched again with get_snapshot while still cached."""
+        return self.snapshots.save(self.pyboy, key)
+
+    def get_snapshot(self, key):
+        return self.snapshots.get(key)
+
+    def restore(self, snapshot):
+        self.snapshots.load(self.pyboy, snapshot)
+
     def get_stat(self, info_name, pokemon_index=0, info_index=0, opponent=False):
-        if info_name not in self.STATS:
+        if info_name not in self.STAT_IDS:
             print(f"Error: {info_name} is not a valid stat")
             return None
 
@@ -80,25 +143,49 @@ class PokeRed:
             )
             return None
 
-        stat_length = self.STATS[info_name]["length"]
-
-        stat_address = self.STATS[info_name]["address"]
-        stat_address += info_index * stat_length
-        stat_address += self.POKEMON_OFFSET * pokemon_index
-        stat_address += self.OPPONENT_OFFSET * opponent
+        return self.read_stat(
+            self.STAT_IDS[info_name],
+            pokemon_index=pokemon_index,
+            info_index=info_index,
+            opponent=opponent,
+        )
 
-        return self.read_multi_byte(stat_address, stat_length)
+    def read_stat(self, stat_id, pokemon_index=0, info_index=0, opponent=False):
+        """Like get_stat, but by stat id (see AddressTable.STAT_IDS) and without validation"""
+        address, length, _, _, _ = ADDRESS_ROWS[stat_id]
+        address += info_index * length
+        address += self.POKEMON_OFFSET * pokemon_index
+        address += self.OPPONENT_OFFSET * opponent
+        return self.read_multi_byte(address, length)
 
     def get_screen(self):
-        return np.array(self.pyboy.screen)
+        if self.debug:
+            self.screen_checksum = zlib.crc32(self.screen)
+        return self.screen
+
+    def get_packed_screen(self, out=None):
+        """The screen as 2 bit palette indices, 4 pixels per byte (see FrameCodec)"""
+        return pack_frame(self.screen, out)
+
+    def check_screen_untouched(self):
+        if self.screen_checksum is not None:
+            assert zlib.crc32(self.screen) == self.screen_checksum, "The shared screen was modified"
 
     def get_poke_info(self, info, info_index=0, opponent=False):
         if info not in self.STATS:
             print(f"Error: {info} is not a valid pokemon info")
             return None
+        stat_info = self.STATS[info]
+        if not stat_info["is_poke_stat"] or info_index >= stat_info["amount"]:
+            # get_stat reports the error for every pokemon
+            return [
+                self.get_stat(info, pokemon_index=i, info_index=info_index, opponent=opponent)
+                for i in range(6)
+            ]
+        stat_id = self.STAT_IDS[info]
         return [
-            self.get_stat(
-                info, pokemon_index=i, info_index=info_index, opponent=opponent
+            self.read_stat(
+                stat_id, pokemon_index=i, info_index=info_index, opponent=opponent
             )
             for i in range(6)
         ]
@@ -123,42 +210,90 @@ class PokeRed:
         """
 
     def get_all_stats(self):
-        all_stats = {}
-        for stat, stat_info in self.STATS.items():
-            if stat_info["is_poke_stat"]:
-                all_stats[stat] = self.get_poke_info(stat)
-            elif stat_info["amount"] > 1:
-                all_stats[stat] = [
-                    self.get_stat(stat, info_index=i)
-                    for i in range(stat_info["amount"])
-                ]
-            else:
-                all_stats[stat] = self.get_stat(stat)
+        self.stat_snapshot.read(self.pyboy.memory)
+        all_stats = self.stat_snapshot.to_dict()
 
         # TODO: remove this, but it's still used a lot
-        all_stats["Relative HP"] = self.read_hp_fraction()
+        all_stats["Relative HP"] = sum(all_stats["HP"]) / sum(all_stats["Max HP"])
+        all_stats["Events"] = self.read_event_count()
 
         return all_stats
 
+    def get_opponent_stats(self):
+        """All pokemon stats of the opponent party, read like get_all_stats"""
+        if not self.opponent_snapshot:
+            self.opponent_snapshot = RamSnapshot(
+                self.STATS,
+                self.POKEMON_OFFSET,
+                opponent_offset=self.OPPONENT_OFFSET,
+                poke_stats_only=True,
+            )
+        self.opponent_snapshot.read(self.pyboy.memory)
+        return self.opponent_snapshot.to_dict()
+
     # For some reason we use this a lot
     def read_hp_fraction(self):
         hp_sum = sum(self.get_poke_info("HP"))
         max_hp_sum = sum(self.get_poke_info("Max HP"))
         return hp_sum / max_hp_sum
 
+    def read_event_count(self):
+        """Number of set event flags, read as one block"""
+        self.event_flags[:] = self.pyboy.memory[self.EVENT_FLAGS_START : self.EVENT_FLAGS_END]
+        museum_address, museum_bit = self.MUSEUM_TICKET
+        museum_ticket = (self.event_flags[museum_address - self.EVENT_FLAGS_START] >> museum_bit) & 1
+        events = int(self.BIT_COUNTS[self.event_flags].sum())
+        return max(events - self.BASE_EVENT_FLAGS - int(museum_ticket), 0)
+
     def run_action_on_emulator(self, action):
+        self.run_action(action)
+
+        stats = self.get_all_stats()
+        frame = self.get_screen()
+        return stats, frame
+
+    def run_action(self, action, render=True):
+        """Only advance the emulator by one action, without reading anything.
+        render=False also skips the last frame, for fast forwarding (fast_ticks only)."""
+        if self.debug:
+            self.check_screen_untouched()
+        if self.fast_ticks:
+            self.run_action_fast(action, render)
+        else:
+            self.run_action_rendered(action)
+
+    def run_action_rendered(self, action):
         # press button then release after some steps
         self.pyboy.send_input(self.VALID_ACTIONS[action])
         for i in range(self.action_freq):
-            if i == 8 and action < len(self.VALID_ACTIONS) - 1:
+            if i == self.RELEASE_FRAME and action < len(self.VALID_ACTIONS) - 1:
                 self.pyboy.send_input(self.RELEASE_ACTIONS[action])
             self.pyboy.tick()
             if self.tick_callback:
                 self.tick_callback()
 
-        stats = self.get_all_stats()
-        frame = self.get_screen()
-        return stats, frame
+    def run_action_fast(self, action, render=True):
+        """Same input schedule as run_action_rendered, but only the last frame is rendered.
+        Without a tick_callback the frames between inputs are run in one tick call."""
+        self.pyboy.send_input(self.VALID_ACTIONS[action])
+        releases = action < len(self.VALID_ACTIONS) - 1
+
+        if self.tick_callback:
+            for i in range(self.action_freq):
+                if i == self.RELEASE_FRAME and releases:
+                    self.pyboy.send_input(self.RELEASE_ACTIONS[action])
+                self.pyboy.tick(1, render and i == self.action_freq - 1)
+                self.tick_callback()
+            return
+
+        remaining = self.action_freq
+        if releases and self.action_freq > self.RELEASE_FRAME:
+            self.pyboy.tick(self.RELEASE_FRAME, False)
+            self.pyboy.send_input(self.RELEASE_ACTIONS[action])
+            remaining -= self.RELEASE_FRAME
+        if remaining > 1:
+            self.pyboy.tick(remaining - 1, False)
+        self.pyboy.tick(1, render)
 
     # Memory reading wrappers
 
@@ -1,12 +1,47 @@
 from math import prod
 import numpy as np
 
+from CoordinateNovelty import CoordinateNovelty
 from KnnHandler import KnnHandler
-from skimage.transform import resize
+from NoveltyServer import NoveltyClient
 
 
 class PokeRedRewarder:
-    def __init__(self):
+    NOVELTY_MODES = ("local", "shared")
+
+    def __init__(
+        self,
+        num_elements=20000,
+        knn_capacity_policy="grow",
+        knn_max_elements=40000,
+        knn_clear_policy="reuse",
+        novelty_mode="local",
+        novelty_address=None,
+        novelty_batch_size=1,
+        events_weight=0.0,
+    ):
+        if novelty_mode not in self.NOVELTY_MODES:
+            raise ValueError(f"Unknown novelty mode {novelty_mode}")
+        self.knn_config = {
+            "num_elements": num_elements,
+            "capacity_policy": knn_capacity_policy,
+            "max_elements": knn_max_elements,
+            "clear_policy": knn_clear_policy,
+        }
+        # Created with the first frame, then cleared and reused every episode
+        self.knn_handler = None
+
+        # "shared": frames are judged by the host wide NoveltyServer instead,
+        # in batches of novelty_batch_size, so the reward lags by up to a batch
+        self.novelty_mode = novelty_mode
+        self.novelty_client = (
+            NoveltyClient(novelty_address) if novelty_mode == "shared" else None
+        )
+        self.novelty_batch_size = novelty_batch_size
+        self.pending_frames = None
+        self.cords_novelty = CoordinateNovelty(sim_dist=4)
+        # Reward per event flag, 0 keeps the events out of the total
+        self.events_weight = events_weight
         self.reset()
 
     def reset(self):
@@ -15,10 +50,15 @@ class PokeRedRewarder:
         self.died_count = 0
         self.hp_fraction = 1
         self.badge = 0
+        self.max_events = 0
         self.knn_reward = 0
         self.total_reward = 1
-        self.knn_handler = None
-        self.knn_handler_cords = None
+        if self.knn_handler:
+            self.knn_handler.clear()
+        # The shared index is not cleared, frames pending from the last episode are dropped
+        self.shared_novel_frames = 0
+        self.pending_count = 0
+        self.cords_novelty.reset()
         self.maps = set()
         
 
@@ -32,40 +72,51 @@ class PokeRedRewarder:
             "explore": 0.02 * self.knn_reward,
             "explore2": 0.02 * self.cords_reward,
             "maps": len(self.maps) - 1,
+            "events": self.events_weight * self.max_events,
         }
         rewards["total"] = sum([val for _, val in rewards.items()])
         return rewards
 
-    def add_to_knn(self, frame):
-        # Convert the Screen object to a numpy array
-        frame_array = np.array(frame)
-        
-        # Reshape the array if necessary (adjust dimensions as needed)
-        frame_vec = frame_array.reshape(-1, frame_array.shape[-1])
-        
-        scaled = (255 * resize(frame_vec, (36, 40), anti_aliasing=True)).astype(np.uint8)
-        scaled = scaled[:, :, :1]
+    def add_to_knn(self, scaled):
+        # scaled is the (36, 40, 1) frame from the env's Downscaler, shared with the observation
+        if self.novelty_client:
+            self.add_to_shared_knn(scaled)
+            return
         if not self.knn_handler:
             #print("Creating new knn handler")
-            self.knn_handler = KnnHandler(vec_dim=prod(scaled.shape))
+            self.knn_handler = KnnHandler(vec_dim=prod(scaled.shape), **self.knn_config)
         self.knn_handler.update_frame_knn_index(scaled)
         
+    def add_to_shared_knn(self, scaled):
+        if self.pending_frames is None:
+            self.pending_frames = np.zeros(
+                (self.novelty_batch_size, scaled.size), dtype=np.uint8
+            )
+        self.pending_frames[self.pending_count] = scaled.ravel()
+        self.pending_count += 1
+        if self.pending_count == self.novelty_batch_size:
+            verdicts = self.novelty_client.submit(self.pending_frames)
+            self.shared_novel_frames += int(verdicts.sum())
+            self.pending_count = 0
+
+    def novel_frames(self):
+        if self.novelty_client:
+            return self.shared_novel_frames
+        return self.knn_handler.count if self.knn_handler else 0
+
     def add_to_cords_knn(self, x, y, map_id):
-        vec = np.array([x, y, map_id * 1000])
-        if not self.knn_handler_cords:
-            #print("Creating new knn handler")
-            self.knn_handler_cords = KnnHandler(vec_dim=3, sim_frame_dist=4)
-        self.knn_handler_cords.update_frame_knn_index(vec)
+        self.cords_novelty.update(x, y, map_id)
 
-    def update_rewards(self, new_stats, new_frame):
+    def update_rewards(self, new_stats, scaled_frame):
         self.max_level_rew = max(self.max_level_rew, sum(new_stats["Level"]))
         self.max_xp_rew = max(self.max_xp_rew, sum(new_stats["XP"]))
         self.badge = new_stats["Badges"]
+        self.max_events = max(self.max_events, new_stats["Events"])
         self.hp_fraction = new_stats["Relative HP"]
-        self.add_to_knn(new_frame)
+        self.add_to_knn(scaled_frame)
         self.add_to_cords_knn(new_stats["X"], new_stats["Y"], new_stats["Map"])
-        self.knn_reward = self.knn_handler.count if self.knn_handler else 0
-        self.cords_reward = self.knn_handler_cords.count if self.knn_handler_cords else 0
+        self.knn_reward = self.novel_frames()
+        self.cords_reward = self.cords_novelty.count
         
         if not new_stats["Map"] in self.maps:
             self.maps.add(new_stats["Map"])
@@ -0,0 +1,117 @@
+import numpy as np
+
+
+class RamSnapshot:
+    """Reads every stat of an address map from one contiguous WRAM slice.
+
+    The byte layout of all stats is compiled once into a gather index, so a read
+    is one memory slice copy plus one vectorized decode instead of one
+    `pyboy.memory` lookup per byte.
+    """
+
+    PARTY_SIZE = 6
+    # Longer stats (nicknames) do not fit into int64 and are decoded as python ints
+    MAX_VECTOR_LENGTH = 8
+
+    def __init__(self, stats, pokemon_offset, opponent_offset=0, poke_stats_only=False):
+        self.stats = {
+            name: info
+            for name, info in stats.items()
+            if info["is_poke_stat"] or not poke_stats_only
+        }
+        self.pokemon_offset = pokemon_offset
+        self.opponent_offset = opponent_offset
+
+        fields = self.compile_fields()
+        addresses = [address for field in fields for address in field["addresses"]]
+        self.start = min(addresses)
+        self.end = max(addresses) + 1
+        self.buffer = np.zeros(self.end - self.start, dtype=np.uint8)
+
+        self.compile_decoder(fields)
+
+    def compile_fields(self):
+        """One field per dict entry, each listing the start address of every value"""
+        fields = []
+        for name, info in self.stats.items():
+            length = info["length"]
+            if info["is_poke_stat"]:
+                # get_poke_info only ever reads the first entry of each pokemon
+                starts = [
+                    info["address"] + self.opponent_offset + self.pokemon_offset * i
+                    for i in range(self.PARTY_SIZE)
+                ]
+                is_list = True
+            else:
+                starts = [info["address"] + length * i for i in range(info["amount"])]
+                is_list = info["amount"] > 1
+            fields.append(
+                {
+                    "name": name,
+                    "length": length,
+                    "starts": starts,
+                    "is_list": is_list,
+                    "addresses": [s + i for s in starts for i in range(length)],
+                }
+            )
+        return fields
+
+    def compile_decoder(self, fields):
+        vector_fields = [f for f in fields if f["length"] <= self.MAX_VECTOR_LENGTH]
+        self.long_fields = [f for f in fields if f["length"] > self.MAX_VECTOR_LENGTH]
+
+        width = max([f["length"] for f in vector_fields], default=1)
+        rows = sum(len(f["starts"]) for f in vector_fields)
+        self.gather = np.zeros((rows, width), dtype=np.intp)
+        self.weights = np.zeros((rows, width), dtype=np.int64)
+
+        # name -> (first row, number of rows, is_list)
+        self.layout = {}
+        row = 0
+        for field in vector_fields:
+            self.layout[field["name"]] = (row, len(field["starts"]), field["is_list"])
+            for start in field["starts"]:
+                length = field["length"]
+                self.gather[row, :length] = np.arange(length) + start - self.start
+                self.weights[row, :length] = 256 ** np.arange(length, dtype=np.int64)
+                row += 1
+
+        self.values = np.zeros(rows, dtype=np.int64)
+        self.gathered = np.zeros((rows, width), dtype=np.uint8)
+        self.weighted = np.zeros((rows, width), dtype=np.int64)
+
+    def read(self, memory):
+        """Copy the WRAM region in one slice and decode all fixed width stats into `values`"""
+        self.buffer[:] = memory[self.start : self.end]
+        np.take(self.buffer, self.gather, out=self.gathered)
+        np.multiply(self.gathered, self.weights, out=self.weighted)
+        np.sum(self.weighted, axis=1, out=self.values)
+        return self.values
+
+    def get(self, name):
+        row, count, is_list = self.layout[name]
+        values = self.values[row : row + count].tolist()
+        return values if is_list else values[0]
+
+    def to_dict(self):
+        """Same structure as the stats dict built by PokeRed.get_all_stats"""
+        values = self.values.tolist()
+        all_stats = {}
+        for name, (row, count, is_list) in self.layout.items():
+            all_stats[name] = values[row : row + count] if is_list else values[row]
+
+        for field in self.long_fields:
+            decoded = [
+                int.from_bytes(
+                    self.buffer[s - self.start : s - self.start + field["length"]].tobytes(),
+                    "little",
+                )
+                for s in field["starts"]
+            ]
+            all_stats[field["name"]] = decoded if field["is_list"] else decoded[0]
+
+        # Dict order follows the address file, like the per-stat reads did
+        return {name: all_stats[name] for name in self.stats}
+
+
+__all__ = ["RamSnapshot"]
@@ -1,81 +1,302 @@
 import json
+import random
+import sys
 import uuid
 
+import numpy as np
+
 from ConfigToAttr import apply_dict_as_attributes
 from EnvInputConstructor import EnvInputConstructor
-from gymnasium import Env
+from FrameCodec import PACKED_SHAPE
+from FrameStack import FrameStack
+from gymnasium import Env, spaces
 from pathlib import Path
 from PokeRed import PokeRed
 from PokeRedRewarder import PokeRedRewarder
-from stable_baselines3.common.utils import set_random_seed
-from future.PokeRecorder import ScreenshotRecorder
+from ScreenshotRecorder import ScreenshotRecorder
+from StateCache import StateCache
+from StepTimer import NullTimer, StepTimer
+from TrajectoryLog import KeyframeWriter, TrajectoryLogWriter
+from VideoEncoderPool import VideoStream
 from datetime import datetime
 
-DEFAULTS_PATH = "./default_config.json"
+# Next to the run scripts, found from wherever the env is imported
+DEFAULTS_PATH = Path(__file__).resolve().parent.parent / "run" / "default_config.json"
 
 with open(DEFAULTS_PATH, "r") as f:
     DEFAULTS = json.load(f)
 
 
 class RedGymEnv(Env):
-    def __init__(self, config=None):
+    OBSERVATION_MODES = ("image", "dict")
+    # Step record of the trajectory log: column (dtype, shape) and the stat it is read from
+    TRAJECTORY_COLUMNS = {
+        "step": ("<i4", ()),
+        "action": ("u1", ()),
+        "x": ("u1", ()),
+        "y": ("u1", ()),
+        "map": ("u1", ()),
+        "levels": ("u1", (6,)),
+        "badges": ("u1", ()),
+    }
+    TRAJECTORY_STATS = {"x": "X", "y": "Y", "map": "Map", "levels": "Level", "badges": "Badges"}
+
+    def __init__(self, config=None, reset=True):
+        """reset=False leaves out the first reset, for a template env (see WorkerTemplate)
+        that is reset after configure_worker"""
         self.load_config(config)
+        self.setup_game()
+        self.setup_observation()
+        self.configure_worker(getattr(self, "rank", 0), instance_id=self.config_instance_id)
+
+        if reset:
+            self.reset()
+
+    def setup_game(self):
+        # init_state can also be a directory or a list, resets then pick one of the states
+        self.state_cache = StateCache(shared=self.shared_state_cache)
+        self.init_states = StateCache.expand(self.init_state)
+        self.state_cache.warmup(self.init_states)
 
         self.poke_red = PokeRed(
-            self.gb_path, state_file=self.init_state, head=self.head
+            self.gb_path,
+            head=self.head,
+            hide_window=self.headless,
+            fast_ticks=self.fast_ticks,
+            debug=self.debug,
+        )
+        self.poke_rewarder = PokeRedRewarder(
+            num_elements=self.num_elements,
+            knn_capacity_policy=self.knn_capacity_policy,
+            knn_max_elements=self.knn_max_elements,
+            knn_clear_policy=self.knn_clear_policy,
+            novelty_mode=self.novelty_mode,
+            novelty_address=self.novelty_address,
+            novelty_batch_size=self.novelty_batch_size,
+            events_weight=self.events_weight,
         )
-        self.poke_rewarder = PokeRedRewarder()
         self.env_input_constructor = EnvInputConstructor()
+        # Their writer threads only start with the first saved frame
         self.game_recorder = ScreenshotRecorder(self.session_path / Path("game"), skip=255)
         self.ml_recorder = ScreenshotRecorder(self.session_path / Path("ml"), skip=255)
+        self.video_recorder = None
+        self.video_streams = None
+        self.packed_screen = np.zeros(PACKED_SHAPE, dtype=np.uint8)
+        self.trajectory_writer = None
+        self.keyframe_writer = None
 
         apply_dict_as_attributes(self, EnvInputConstructor.ENV_CONFIG)
 
-        self.reset()
+    def configure_worker(self, rank, instance_id=None):
+        """The per rank settings, cheap enough to apply to a copy of a template env
+        (see WorkerTemplate)"""
+        self.rank = rank
+        # The defaults have instance_id null, so every env gets its own
+        self.instance_id = str(uuid.uuid4())[:8] if instance_id is None else instance_id
+        self.setup_step_timer()
+
+    def setup_observation(self):
+        """observation_mode "image": the frame with info bars (46, 40, stacks).
+        "dict": the plain frame (36, 40, stacks) and a stats vector read from RAM."""
+        if self.observation_mode not in self.OBSERVATION_MODES:
+            raise ValueError(f"Unknown observation mode {self.observation_mode}")
+        if self.observation_mode == "dict":
+            frame_shape = self.env_input_constructor.downscaler.out_shape
+            self.env_input_constructor.setup_stats(self.poke_red.stat_snapshot.layout)
+        else:
+            frame_shape = self.combined_shape
+
+        self.frame_stack = None
+        if self.frame_stacks > 1:
+            self.frame_stack = FrameStack(frame_shape, self.frame_stacks)
+            frame_shape = self.frame_stack.shape
+        frame_space = spaces.Box(low=0, high=255, shape=frame_shape, dtype=np.uint8)
+
+        if self.observation_mode == "dict":
+            self.observation_space = spaces.Dict(
+                {"frame": frame_space, "stats": EnvInputConstructor.STATS_SPACE}
+            )
+        else:
+            self.observation_space = frame_space
+
+    def setup_step_timer(self):
+        """With step_timing, the phase timings of all steps so far are added to the info
+        every step_timing_interval steps and written to the session path"""
+        if self.step_timing:
+            summary_path = self.session_path / f"step_timing_{self.instance_id}.json"
+            self.step_timer = StepTimer(self.step_timing_interval, summary_path)
+        else:
+            self.step_timer = NullTimer()
+
+    def build_observation(self, ml_observation, scaled_frame, new_episode=False):
+        frame = scaled_frame if self.observation_mode == "dict" else ml_observation
+        if self.frame_stack:
+            frame = self.frame_stack.reset(frame) if new_episode else self.frame_stack.push(frame)
+        if self.observation_mode == "dict":
+            stats = self.env_input_constructor.render_stats(self.poke_red.stat_snapshot.values)
+            return {"frame": frame, "stats": stats}
+        return frame
 
     def load_config(self, config):
         config = {**DEFAULTS, **(config or {})}
         apply_dict_as_attributes(self, config)
 
-        self.instance_id = (
-            str(uuid.uuid4())[:8]
-            if "instance_id" not in config
-            else config["instance_id"]
-        )
+        self.config_instance_id = config.get("instance_id")
+        # Also a string, for configs that went through json (see WorkerTemplate)
+        self.session_path = Path(self.session_path)
         self.session_path.mkdir(exist_ok=True)
         self.head = "headless" if self.headless else "SDL2"
     
 
     def reset(self, seed=None):
+        if self.trajectory_writer is not None:
+            self.end_trajectory_episode()
+            self.trajectory_writer.end_episode(self.seed)
         self.seed = seed if seed else datetime.now().microsecond
         
         # (re)start game, skipping credits
-        self.poke_red.load_from_state(self.init_state)
+        self.poke_red.load_from_state(self.state_cache.load(self.choose_init_state()))
         self.poke_rewarder.reset()
         self.last_total_reward = 0
         self.step_count = 0
 
         # getting first observation
         stats, frame = self.poke_red.get_all_stats(), self.poke_red.get_screen()
-        rewards = self.poke_rewarder.update_rewards(stats, frame)
-        observation = self.env_input_constructor.render_for_ml(stats, frame, rewards)
+        scaled_frame = self.env_input_constructor.scale_frame(frame)
+        rewards = self.poke_rewarder.update_rewards(stats, scaled_frame)
+        ml_observation = self.env_input_constructor.render_for_ml(stats, scaled_frame, rewards)
+        observation = self.build_observation(ml_observation, scaled_frame, new_episode=True)
+        if self.trajectory_log and self.trajectory_writer is None:
+            self.open_trajectory_log(rewards)
 
         self.reset_count += 1
+        if self.save_video:
+            self.start_video()
         return observation, {}
 
+    def open_trajectory_log(self, rewards):
+        """The trajectory log of this env, its reward columns are the keys of the rewards"""
+        columns = dict(self.TRAJECTORY_COLUMNS)
+        columns.update({self.reward_column(key): ("<f4", ()) for key in rewards})
+        if self.trajectory_frames:
+            columns["frame"] = ("u1", PACKED_SHAPE)
+        path = self.session_path / "trajectories" / self.instance_id
+        self.trajectory_writer = TrajectoryLogWriter(
+            path, columns, chunk_steps=self.trajectory_chunk_steps
+        )
+        if self.trajectory_keyframe_interval:
+            self.keyframe_writer = KeyframeWriter(path, self.trajectory_writer.steps)
+
+    def save_keyframe(self):
+        """Every trajectory_keyframe_interval steps (and at step 0), the emulator
+        before the action, so a ReplayEngine can seek in the log"""
+        if self.step_count % self.trajectory_keyframe_interval == 0:
+            self.keyframe_writer.add(
+                self.trajectory_writer.next_row,
+                self.poke_red.save_state(),
+                self.poke_red.ram_checksum(),
+            )
+
+    def end_trajectory_episode(self):
+        """With keyframes, the RAM checksum after the last step of the episode, so a
+        ReplayEngine can verify it up to the end"""
+        writer = self.trajectory_writer
+        if self.keyframe_writer is not None and writer.next_row > writer.episode_start:
+            self.keyframe_writer.add_checksum(writer.next_row, self.poke_red.ram_checksum())
+
+    def log_step(self, action, rewards):
+        """Append the step to the trajectory log of this env"""
+        snapshot = self.poke_red.stat_snapshot
+        record = {column: snapshot.get(stat) for column, stat in self.TRAJECTORY_STATS.items()}
+        record.update({self.reward_column(key): value for key, value in rewards.items()})
+        if self.trajectory_frames:
+            record["frame"] = self.poke_red.get_packed_screen(self.packed_screen)
+        # step_count is already increased, the first step of an episode is 0
+        self.trajectory_writer.append(step=self.step_count - 1, action=action, **record)
+
+    @staticmethod
+    def reward_column(key):
+        return "reward_" + key.lower().replace(" ", "_")
+
+    def start_video(self):
+        """Finish the video of the last episode and start one for the next, with
+        video_encoder_addresses it is encoded by a VideoEncoderPool instead of here"""
+        from future.PokeRecorder import PokeRecorder
+
+        self.finish_video()
+        if self.video_encoder_addresses and self.video_streams is None:
+            addresses = self.video_encoder_addresses
+            address = tuple(addresses[self.rank % len(addresses)])
+            self.video_streams = (VideoStream(address), VideoStream(address))
+        self.video_recorder = PokeRecorder(
+            self.session_path,
+            self.instance_id,
+            self.combined_shape,
+            reset_count=self.reset_count,
+            streams=self.video_streams or (None, None),
+        )
+
+    def finish_video(self):
+        if self.video_recorder is not None:
+            self.video_recorder.finish_video()
+            self.video_recorder = None
+
+    def choose_init_state(self):
+        if len(self.init_states) == 1:
+            return self.init_states[0]
+        return random.Random(self.seed).choice(self.init_states)
+
     def step(self, action):
-        stats, frame = self.poke_red.run_action_on_emulator(action)
-        rewards = self.poke_rewarder.update_rewards(stats, frame)
-        observation = self.env_input_constructor.render_for_ml(stats, frame, rewards) 
+        self.start_step()
+        self.poke_red.run_action(action)
+        return self.finish_step(action)
+
+    def start_step(self):
+        """The part of a step before the emulator runs the action"""
+        self.step_timer.start()
+        if self.keyframe_writer is not None:
+            self.save_keyframe()
+
+    def finish_step(self, action, stats=None, frame=None):
+        """The part of a step after the emulator ran the action. BatchedVecEnv passes the
+        stats and the screen its BatchedPokeRed already read, else they are read here."""
+        timer = self.step_timer
+        timer.lap("emulation")
+        if stats is None:
+            stats, frame = self.poke_red.get_all_stats(), self.poke_red.get_screen()
+        timer.lap("stats")
+        # Downscaled once, for both the novelty index and the observation
+        scaled_frame = self.env_input_constructor.scale_frame(frame)
+        timer.lap("downscale")
+        rewards = self.poke_rewarder.update_rewards(stats, scaled_frame)
+        timer.lap("rewards")
+        ml_observation = self.env_input_constructor.render_for_ml(stats, scaled_frame, rewards)
+        observation = self.build_observation(ml_observation, scaled_frame)
+        timer.lap("observation")
         
         reward_for_step = rewards["total"] - self.last_total_reward
         self.last_total_reward = rewards["total"]
 
         step_limit_reached = self.increase_step_count()
+        if step_limit_reached:
+            # Vec envs keep the last observation of an episode past reset, which reuses the buffers
+            if self.observation_mode == "dict":
+                observation = {key: value.copy() for key, value in observation.items()}
+            else:
+                observation = observation.copy()
         
-        image_note = f"cpu{self.rank}_s{self.step_count}_r{rewards['total']:4f}_a{action}"
+        # Only formatted for the frames that are saved
+        image_note = lambda: f"cpu{self.rank}_s{self.step_count}_r{rewards['total']:4f}_a{action}"
+        if self.pack_frames:
+            # 16 times less to copy and send, the recorders decode it when they write
+            frame = self.poke_red.get_packed_screen(self.packed_screen)
         self.game_recorder.add(frame, note=image_note)
-        self.ml_recorder.add(observation, note=image_note)
+        self.ml_recorder.add(ml_observation, note=image_note)
+        if self.video_recorder is not None:
+            self.video_recorder.add_video_frame(frame, ml_observation)
+        if self.trajectory_log:
+            self.log_step(action, rewards)
+        timer.lap("recording")
         
         if reward_for_step < 0 or reward_for_step > 1:
             print(f"Reward for step: {reward_for_step:4f}")
@@ -87,7 +308,9 @@ class RedGymEnv(Env):
             reward_for_step = 0
         """
             
-        return observation, reward_for_step, False, step_limit_reached, {}
+        timing = timer.stop()
+        info = {} if timing is None else {"step_timing": timing}
+        return observation, reward_for_step, False, step_limit_reached, info
 
     def increase_step_count(self):
         """Increase the step count by 1  and returns if the step limit has been reached."""
@@ -97,6 +320,16 @@ class RedGymEnv(Env):
     def check_if_done(self):
         return self.step_count >= self.max_steps
 
+    def close(self):
+        if self.trajectory_writer is not None:
+            self.end_trajectory_episode()
+            self.trajectory_writer.close(self.seed)
+        self.finish_video()
+        for stream in self.video_streams or ():
+            stream.close()
+        self.game_recorder.close()
+        self.ml_recorder.close()
+
     def render(self, **kwargs):
         # check if there are any kwargs, just curious
         if len(kwargs) > 0:
@@ -107,11 +340,18 @@ class RedGymEnv(Env):
 
 
 def make_env(rank, env_conf, seed=0):
+    """Env factory for the vec envs. In a worker forked from a server that preloaded a
+    WorkerTemplate of the same config, the template env is used instead of building one."""
+    from stable_baselines3.common.utils import set_random_seed
+
     seed = datetime.now().microsecond if seed == 0 else seed
     def _init():
-        env_conf["rank"] = rank
-        env_conf["seed"] = seed
-        env = RedGymEnv(env_conf)
+        # Only there if the process was forked from the preloading server
+        worker_template = sys.modules.get("WorkerTemplate")
+        env = worker_template.take(env_conf) if worker_template else None
+        if env is None:
+            env = RedGymEnv({**env_conf, "rank": rank, "seed": seed}, reset=False)
+        env.configure_worker(rank, instance_id=env_conf.get("instance_id"))
         env.reset(seed=(seed + rank))
         return env
 
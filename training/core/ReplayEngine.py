@@ -0,0 +1,108 @@
+import numpy as np
+
+from PokeRed import PokeRed
+from TrajectoryLog import TrajectoryLogReader
+
+
+class ReplayMismatch(ValueError):
+    """The replayed RAM differs from a keyframe, the run is not deterministic"""
+
+
+class ReplayEngine:
+    """Seeks to any row of a trajectory log with keyframes (see KeyframeWriter).
+
+    seek() loads the last keyframe at or before the row, unless the emulator
+    is already between it and the row, and runs the logged actions up to
+    it without rendering, rewards or observations. With verify, the RAM
+    checksum is compared with every keyframe that is passed on the way, and
+    with the checksum recorded at the end of an episode. The emulator is then
+    in the state before the action of the row. At the first row of an
+    episode (step 0) the keyframe of the reset is loaded.
+    """
+
+    def __init__(self, gb_path, log_path, verify=True):
+        self.log = TrajectoryLogReader(log_path)
+        self.actions = np.asarray(self.log["action"])
+        self.steps = np.asarray(self.log["step"])
+        keyframes = self.log.keyframes
+        # Entries without a state are the checksums at the end of the episodes
+        self.keyframes = keyframes[keyframes["length"] > 0]
+        self.end_checksums = dict(
+            zip(keyframes["row"][keyframes["length"] == 0].tolist(),
+                keyframes["crc"][keyframes["length"] == 0].tolist())
+        )
+        if len(self.keyframes) == 0:
+            raise ValueError(f"{log_path} has no keyframes, record with trajectory_keyframe_interval")
+        self.keyframe_index = {row: i for i, row in enumerate(self.keyframes["row"].tolist())}
+        self.verify = verify
+        self.poke_red = PokeRed(gb_path, hide_window=True)
+        self.row = None
+        self.checked = 0
+
+    def episode_row(self, episode, step=0):
+        """Row of a step of an episode of the log"""
+        start, length, _ = self.log.episodes[episode]
+        if not 0 <= step <= length:
+            raise ValueError(f"Episode {episode} has {length} steps, not {step}")
+        return int(start + step)
+
+    def seek(self, row):
+        """Bring the emulator to the state before the action of `row`, returns the keyframes passed"""
+        if not 0 <= row <= len(self.actions):
+            raise ValueError(f"The log has {len(self.actions)} rows, can't seek to {row}")
+        index = np.searchsorted(self.keyframes["row"], row, side="right") - 1
+        if index < 0:
+            raise ValueError(f"No keyframe at or before row {row}")
+        if self.row is None or not self.keyframes["row"][index] <= self.row <= row:
+            self.load(self.keyframes[index])
+        return self.advance(row - self.row, render=False)
+
+    def load(self, keyframe):
+        self.poke_red.load_from_state(self.log.keyframe_state(keyframe))
+        self.row = int(keyframe["row"])
+
+    def advance(self, steps, render=True):
+        """Run the next logged actions, the keyframes they reach are verified"""
+        passed = 0
+        for _ in range(steps):
+            self.poke_red.run_action(int(self.actions[self.row]), render)
+            self.row += 1
+            if self.verify and self.row in self.end_checksums:
+                self.check(self.end_checksums[self.row], "the end of the episode")
+                passed += 1
+            if self.row not in self.keyframe_index:
+                continue
+            keyframe = self.keyframes[self.keyframe_index[self.row]]
+            if self.row < len(self.steps) and self.steps[self.row] == 0:
+                # A new episode, it starts from the state of its reset
+                self.load(keyframe)
+            elif self.verify:
+                self.check(keyframe["crc"], "the keyframe")
+                passed += 1
+        return passed
+
+    def check(self, expected, source):
+        crc = self.poke_red.ram_checksum()
+        if crc != expected:
+            raise ReplayMismatch(
+                f"RAM checksum {crc:08x} at row {self.row}, {source} has {expected:08x}"
+            )
+        self.checked += 1
+
+    def frames(self, start, stop):
+        """Screens after the actions of the rows start to stop - 1"""
+        self.seek(start)
+        while self.row < stop:
+            self.advance(1)
+            yield self.poke_red.get_screen()
+
+    def verify_episode(self, episode):
+        """Replay a whole episode from its first keyframe, every keyframe of it and
+        the checksum after its last step have to match"""
+        start, length, _ = self.log.episodes[episode]
+        self.row = None
+        self.seek(int(start))
+        return self.advance(int(length), render=False)
+
+
+__all__ = ["ReplayEngine", "ReplayMismatch"]
@@ -0,0 +1,78 @@
+import queue
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from FrameCodec import decode_frame, is_packed
+
+
+class ScreenshotRecorder:
+    """Saves every (skip + 1)th frame as png, written by a background thread.
+
+    add() only counts frames that are skipped. For a frame that is saved, the
+    note is built (it can be a callable, so the string is only formatted
+    then) and a copy of the frame is queued. The queue is bounded: when the
+    writer falls behind, frames are dropped (see `dropped`) instead of
+    stalling the env. Packed frames (see FrameCodec) are decoded by the writer.
+    """
+
+    def __init__(self, path, skip=0, max_pending=8):
+        self.path = path
+        if not type(self.path) == Path:
+            self.path = Path(self.path)
+        self.path.mkdir(exist_ok=True)
+        self.count = 0
+        self.skip = skip
+        self.skipped = 0
+        self.dropped = 0
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.writer = None
+
+    def add(self, frame, note=None):
+        self.count += 1
+        if self.skipped < self.skip:
+            self.skipped += 1
+            return
+        self.skipped = 0
+
+        note = note() if callable(note) else note
+        note = "_" + note if note else ''
+        filename = f"frame{self.count}{note}.png"
+
+        if self.writer is None:
+            self.start()
+        try:
+            # The frame is usually a buffer the env reuses, so copy it now
+            self.queue.put_nowait((self.path / Path(filename), np.array(frame)))
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        self.writer = threading.Thread(target=self.write_frames, daemon=True)
+        self.writer.start()
+
+    def write_frames(self):
+        # Imported here, so workers that never save a frame don't import matplotlib
+        from matplotlib.image import imsave
+
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            path, frame = item
+            if is_packed(frame):
+                frame = decode_frame(frame)
+            if frame.shape[2] == 1:
+                frame = np.repeat(frame, 3, axis=2)
+            imsave(path, frame)
+
+    def close(self):
+        """Write the queued frames and stop the writer"""
+        if self.writer is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.writer = None
+
+
+__all__ = ["ScreenshotRecorder"]
@@ -0,0 +1,50 @@
+import mmap
+import os
+from multiprocessing import shared_memory
+
+try:
+    import _posixshmem
+except ImportError:
+    # Windows, where shared memory is not tracked
+    _posixshmem = None
+
+
+class UntrackedBlock:
+    """An existing POSIX shared memory block, opened like SharedMemory(name, track=False)
+    does on Python 3.13: the same name, size, buf and close(), but no resource tracker."""
+
+    def __init__(self, name):
+        fd = _posixshmem.shm_open("/" + name, os.O_RDWR, mode=0o600)
+        try:
+            self.size = os.fstat(fd).st_size
+            self._mmap = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+        self.name = name
+        self.buf = memoryview(self._mmap)
+
+    def close(self):
+        if self.buf is not None:
+            self.buf.release()
+            self.buf = None
+            self._mmap.close()
+
+
+def attach(name):
+    """Open a block created by another process without tracking it here.
+
+    A tracked block is unlinked (with a leak warning) by this process's resource
+    tracker when it exits, even though the creator still uses it. Unregistering
+    after attaching is no fix: when the tracker is shared with the creator (forked
+    workers), that drops the creator's registration too.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+    if _posixshmem is None:
+        return shared_memory.SharedMemory(name=name)
+    return UntrackedBlock(name)
+
+
+__all__ = ["UntrackedBlock", "attach"]
@@ -0,0 +1,338 @@
+import multiprocessing as mp
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import wait
+
+import numpy as np
+from gymnasium import spaces
+from stable_baselines3.common.vec_env.base_vec_env import CloudpickleWrapper, VecEnv
+from stable_baselines3.common.vec_env.patch_gym import _patch_env
+
+import SharedBlock
+from LatencyHistogram import LatencyHistogram
+
+
+def observation_specs(observation_space):
+    """(shape, dtype) of every observation key, None is the key of a plain Box space"""
+    if isinstance(observation_space, spaces.Dict):
+        return {key: (space.shape, space.dtype) for key, space in observation_space.spaces.items()}
+    return {None: (observation_space.shape, observation_space.dtype)}
+
+
+class SharedArrays:
+    """Named numpy arrays in shared memory, created by the parent and attached by the workers"""
+
+    def __init__(self, specs, names=None):
+        self.specs = specs
+        self.owner = names is None
+        self.blocks = {}
+        self.arrays = {}
+        for key, (shape, dtype) in specs.items():
+            size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            if self.owner:
+                block = shared_memory.SharedMemory(create=True, size=size)
+            else:
+                # Untracked, or the resource tracker of a worker that has its own (forked before
+                # the parent started one) unlinks the blocks when the worker exits
+                block = SharedBlock.attach(names[key])
+            self.blocks[key] = block
+            self.arrays[key] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+        if self.owner:
+            for array in self.arrays.values():
+                array.fill(0)
+
+    @property
+    def names(self):
+        return {key: block.name for key, block in self.blocks.items()}
+
+    def __getitem__(self, key):
+        return self.arrays[key]
+
+    def close(self):
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            if self.owner:
+                block.unlink()
+        self.blocks = {}
+
+
+def _worker(remote, parent_remote, env_fn_wrapper, index):
+    # Import here to avoid a circular import
+    from stable_baselines3.common.env_util import is_wrapped
+
+    parent_remote.close()
+    env = _patch_env(env_fn_wrapper.var())
+    remote.send((env.observation_space, env.action_space))
+    _, (specs, names) = remote.recv()
+    shared = SharedArrays(specs, names)
+    obs_keys = [key for key in specs if isinstance(key, tuple) and key[0] == "obs"]
+
+    def write_obs(observation, prefix):
+        for _, key in obs_keys:
+            shared[(prefix, key)][index] = observation if key is None else observation[key]
+
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                start = time.perf_counter()
+                observation, reward, terminated, truncated, info = env.step(data)
+                done = terminated or truncated
+                reset_info = None
+                if done:
+                    # The final observation goes into the terminal slot, then reset
+                    write_obs(observation, "terminal")
+                    observation, reset_info = env.reset()
+                write_obs(observation, "obs")
+                shared["rewards"][index] = reward
+                shared["dones"][index] = done
+                # Only the flags, the step time and non empty dicts go over the pipe
+                duration = time.perf_counter() - start
+                remote.send((truncated and not terminated, info or None, reset_info or None, duration))
+            elif cmd == "reset":
+                maybe_options = {"options": data[1]} if data[1] else {}
+                observation, reset_info = env.reset(seed=data[0], **maybe_options)
+                write_obs(observation, "obs")
+                remote.send(reset_info or None)
+            elif cmd == "render":
+                remote.send(env.render())
+            elif cmd == "close":
+                env.close()
+                remote.close()
+                break
+            elif cmd == "env_method":
+                method = env.get_wrapper_attr(data[0])
+                remote.send(method(*data[1], **data[2]))
+            elif cmd == "get_attr":
+                remote.send(env.get_wrapper_attr(data))
+            elif cmd == "set_attr":
+                remote.send(setattr(env, data[0], data[1]))
+            elif cmd == "is_wrapped":
+                remote.send(is_wrapped(env, data))
+            else:
+                raise NotImplementedError(f"`{cmd}` is not implemented in the worker")
+    except KeyboardInterrupt:
+        print("SharedMemoryVecEnv worker: got KeyboardInterrupt")
+    finally:
+        shared.close()
+
+
+class SharedMemoryVecEnv(VecEnv):
+    """Drop-in for SubprocVecEnv that keeps observations, rewards and dones in shared memory.
+
+    Each worker writes its step results into its own slot of the shared arrays,
+    the pipe only carries the action and a small reply (truncation flag, and the
+    info dicts if they are not empty). Final observations of finished episodes
+    have their own slot, so auto reset does not overwrite them.
+
+    The arrays are reused every step, step_wait returns copies of them because
+    SB3 keeps the previous observation around while the next step runs.
+
+    Besides the synchronous VecEnv API there is an asynchronous one for custom
+    rollout loops: send() steps some envs, recv() returns the envs that are
+    done stepping as soon as batch_size of them are, or when timeout seconds
+    passed, so slow steps (resets, novelty inserts, screenshots) don't hold up
+    the others. The step time of every worker is kept in a LatencyHistogram.
+    """
+
+    def __init__(self, env_fns, start_method=None, batch_size=None, timeout=None):
+        self.waiting = False
+        self.closed = False
+        # Envs stepped with send() that were not returned by recv() yet
+        self.pending = set()
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.latencies = [LatencyHistogram() for _ in env_fns]
+        n_envs = len(env_fns)
+
+        if start_method is None:
+            # forkserver is faster than spawn and safer than fork with threads
+            forkserver_available = "forkserver" in mp.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+        ctx = mp.get_context(start_method)
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe() for _ in range(n_envs)])
+        self.processes = []
+        for index, (work_remote, remote, env_fn) in enumerate(
+            zip(self.work_remotes, self.remotes, env_fns)
+        ):
+            args = (work_remote, remote, CloudpickleWrapper(env_fn), index)
+            # daemon=True: if the main process crashes, we should not cause things to hang
+            process = ctx.Process(target=_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        observation_space, action_space = self.remotes[0].recv()
+        for remote in self.remotes[1:]:
+            remote.recv()
+
+        specs = {}
+        for key, (shape, dtype) in observation_specs(observation_space).items():
+            specs[("obs", key)] = ((n_envs, *shape), dtype)
+            specs[("terminal", key)] = ((n_envs, *shape), dtype)
+        specs["rewards"] = ((n_envs,), np.float32)
+        specs["dones"] = ((n_envs,), bool)
+        self.shared = SharedArrays(specs)
+        for remote in self.remotes:
+            remote.send(("attach", (specs, self.shared.names)))
+
+        self.obs_keys = list(observation_specs(observation_space))
+        super().__init__(n_envs, observation_space, action_space)
+
+    def obs(self, prefix="obs", env_index=None):
+        """Copy of the observations (of all envs, or only of env_index)"""
+        select = slice(None) if env_index is None else env_index
+        if self.obs_keys == [None]:
+            return self.shared[(prefix, None)][select].copy()
+        return {key: self.shared[(prefix, key)][select].copy() for key in self.obs_keys}
+
+    def step_async(self, actions):
+        if self.pending:
+            raise RuntimeError(f"Envs {sorted(self.pending)} are still stepping asynchronously")
+        for remote, action in zip(self.remotes, actions):
+            remote.send(("step", action))
+        self.waiting = True
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        return self.collect(range(self.num_envs), results)
+
+    def send(self, actions, env_ids=None):
+        """Start stepping env_ids (default: all envs) with actions, without waiting for them"""
+        env_ids = range(self.num_envs) if env_ids is None else env_ids
+        for env_id, action in zip(env_ids, actions):
+            env_id = int(env_id)
+            if env_id in self.pending:
+                raise RuntimeError(f"Env {env_id} is still stepping")
+            self.remotes[env_id].send(("step", action))
+            self.pending.add(env_id)
+
+    def recv(self, batch_size=None, timeout=None):
+        """Results of envs stepped with send() that are ready.
+
+        Waits until at least batch_size (default: the batch_size of the
+        constructor, else all pending envs) are ready or timeout seconds
+        passed, then also returns every other env that is ready by then. If
+        nothing is ready at the timeout, waits for the first env that is.
+        Returns env_ids, obs, rewards, dones, infos, all in the order of env_ids.
+        """
+        if not self.pending:
+            raise RuntimeError("No envs are stepping, send() actions first")
+        batch_size = batch_size or self.batch_size or len(self.pending)
+        batch_size = min(batch_size, len(self.pending))
+        timeout = self.timeout if timeout is None else timeout
+        deadline = None if timeout is None else time.perf_counter() + timeout
+
+        remote_ids = {self.remotes[env_id]: env_id for env_id in self.pending}
+        ready = []
+        while remote_ids and len(ready) < max(batch_size, 1):
+            remaining = None if deadline is None else max(0.0, deadline - time.perf_counter())
+            if remaining == 0.0 and ready:
+                break
+            # Past the deadline with nothing ready, block for the first one
+            for remote in wait(list(remote_ids), remaining if remaining else None):
+                ready.append(remote_ids.pop(remote))
+        # Everything else that is ready already comes along for free
+        for remote in wait(list(remote_ids), 0):
+            ready.append(remote_ids.pop(remote))
+
+        env_ids = np.array(sorted(ready), dtype=np.int64)
+        results = [self.remotes[env_id].recv() for env_id in env_ids]
+        self.pending.difference_update(ready)
+        obs, rewards, dones, infos = self.collect(env_ids, results)
+        return env_ids, obs, rewards, dones, infos
+
+    def collect(self, env_ids, results):
+        """Copy the step results of env_ids out of the shared arrays"""
+        env_ids = np.asarray(env_ids, dtype=np.int64)
+        dones = self.shared["dones"][env_ids]
+        infos = []
+        for env_id, done, (truncated, info, reset_info, duration) in zip(env_ids, dones, results):
+            self.latencies[env_id].add(duration)
+            info = info or {}
+            info["TimeLimit.truncated"] = truncated
+            if done:
+                info["terminal_observation"] = self.obs("terminal", env_id)
+                self.reset_infos[env_id] = reset_info or {}
+            infos.append(info)
+        return self.obs(env_index=env_ids), self.shared["rewards"][env_ids], dones, infos
+
+    def latency_stats(self):
+        """Step time summary of each worker, and of all of them together"""
+        total = LatencyHistogram()
+        for histogram in self.latencies:
+            total.merge(histogram)
+        return {
+            "workers": [histogram.summary() for histogram in self.latencies],
+            "all": total.summary(),
+        }
+
+    def reset(self):
+        if self.pending:
+            raise RuntimeError(f"Envs {sorted(self.pending)} are still stepping asynchronously")
+        for env_idx, remote in enumerate(self.remotes):
+            remote.send(("reset", (self._seeds[env_idx], self._options[env_idx])))
+        self.reset_infos = [remote.recv() or {} for remote in self.remotes]
+        # Seeds and options are only used once
+        self._reset_seeds()
+        self._reset_options()
+        return self.obs()
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for env_id in self.pending:
+            self.remotes[env_id].recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.shared.close()
+        self.closed = True
+
+    def get_images(self):
+        if self.render_mode != "rgb_array":
+            print(f"The render mode is {self.render_mode}, but this method assumes it is `rgb_array` to obtain images.")
+            return [None for _ in self.remotes]
+        for pipe in self.remotes:
+            # gather render return from subprocesses
+            pipe.send(("render", None))
+        return [pipe.recv() for pipe in self.remotes]
+
+    def get_attr(self, attr_name, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("get_attr", attr_name))
+        return [remote.recv() for remote in target_remotes]
+
+    def set_attr(self, attr_name, value, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("set_attr", (attr_name, value)))
+        for remote in target_remotes:
+            remote.recv()
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("env_method", (method_name, method_args, method_kwargs)))
+        return [remote.recv() for remote in target_remotes]
+
+    def env_is_wrapped(self, wrapper_class, indices=None):
+        target_remotes = self._get_target_remotes(indices)
+        for remote in target_remotes:
+            remote.send(("is_wrapped", wrapper_class))
+        return [remote.recv() for remote in target_remotes]
+
+    def _get_target_remotes(self, indices):
+        indices = self._get_indices(indices)
+        return [self.remotes[i] for i in indices]
+
+
+__all__ = ["SharedMemoryVecEnv"]
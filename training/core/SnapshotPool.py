@@ -0,0 +1,117 @@
+import io
+from collections import OrderedDict
+
+
+class Snapshot:
+    """An in memory emulator save state, reference counted by its users.
+
+    Unreferenced snapshots stay cached in their pool (and can be looked up by key)
+    until the pool needs the space. A snapshot that is replaced or dropped while
+    acquired stays loadable until its last release."""
+
+    def __init__(self, pool, key, buffer):
+        self.pool = pool
+        self.key = key
+        self.buffer = buffer
+        self.refs = 0
+
+    def acquire(self):
+        self.refs += 1
+        return self
+
+    def release(self):
+        if self.refs <= 0:
+            raise RuntimeError(f"Snapshot {self.key} released more often than acquired")
+        self.refs -= 1
+        if self.refs == 0 and self.pool is not None:
+            self.pool.released(self)
+
+    def size(self):
+        return self.buffer.getbuffer().nbytes
+
+
+class SnapshotPool:
+    """Bounded LRU of emulator snapshots, reusing the buffers of evicted ones.
+
+    max_snapshots caps every buffer the pool handed out: the cached snapshots
+    and the replaced or dropped ones that are still held."""
+
+    def __init__(self, max_snapshots=32):
+        self.max_snapshots = max_snapshots
+        self.snapshots = OrderedDict()
+        # No longer cached but still held, until their last release
+        self.detached = set()
+        self.free_buffers = []
+        self.next_id = 0
+
+    def save(self, pyboy, key=None):
+        """Snapshot the emulator, the returned snapshot is acquired for the caller"""
+        if key is None:
+            key = self.next_id
+            self.next_id += 1
+        if key in self.snapshots:
+            self.drop(key)
+        self.make_room()
+
+        buffer = self.free_buffers.pop() if self.free_buffers else io.BytesIO()
+        # Overwrite in place, save states of one ROM always have the same size
+        buffer.seek(0)
+        pyboy.save_state(buffer)
+        buffer.truncate()
+
+        snapshot = Snapshot(self, key, buffer)
+        self.snapshots[key] = snapshot
+        return snapshot.acquire()
+
+    def load(self, pyboy, snapshot):
+        if snapshot.pool is not self or snapshot.buffer is None:
+            raise ValueError(f"Snapshot {snapshot.key} is not (or no longer) in this pool")
+        if self.snapshots.get(snapshot.key) is snapshot:
+            self.snapshots.move_to_end(snapshot.key)
+        snapshot.buffer.seek(0)
+        pyboy.load_state(snapshot.buffer)
+
+    def get(self, key):
+        """Look up a cached snapshot, acquired for the caller, or None if it was evicted"""
+        snapshot = self.snapshots.get(key)
+        if snapshot is None:
+            return None
+        self.snapshots.move_to_end(key)
+        return snapshot.acquire()
+
+    def make_room(self):
+        while len(self.snapshots) + len(self.detached) >= self.max_snapshots:
+            unused = next((k for k, s in self.snapshots.items() if s.refs == 0), None)
+            if unused is None:
+                raise RuntimeError(
+                    f"All {self.max_snapshots} snapshots are in use, release some first"
+                )
+            self.drop(unused)
+
+    def drop(self, key):
+        snapshot = self.snapshots.pop(key)
+        # Still referenced, the buffer is reused after the last release
+        if snapshot.refs == 0:
+            self.recycle(snapshot)
+        else:
+            self.detached.add(snapshot)
+
+    def released(self, snapshot):
+        if snapshot in self.detached:
+            self.detached.remove(snapshot)
+            self.recycle(snapshot)
+
+    def recycle(self, snapshot):
+        self.free_buffers.append(snapshot.buffer)
+        snapshot.buffer = None
+        snapshot.pool = None
+
+    def clear(self):
+        for key in list(self.snapshots):
+            self.drop(key)
+
+    def memory_usage(self):
+        return sum(s.size() for s in [*self.snapshots.values(), *self.detached])
+
+
+__all__ = ["Snapshot", "SnapshotPool"]
@@ -0,0 +1,105 @@
+import atexit
+import hashlib
+import os
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import SharedBlock
+
+
+class StateCache:
+    """Keeps the bytes of save state files in memory, so they are read from disk at most once per process.
+
+    With `shared=True` the first process to read a state also publishes it in a shared memory block,
+    and the other workers on the host copy it from there instead of touching the disk.
+    A block lives as long as the process that created it.
+    """
+
+    STATE_SUFFIX = ".state"
+    SHM_PREFIX = "pokered_state_"
+    # Blocks start with the blob length, written after the blob itself so readers never see half a state
+    HEADER_SIZE = 8
+
+    # Per process, shared by all caches (and envs) in it
+    blobs = {}
+    published = {}
+
+    def __init__(self, shared=False):
+        self.shared = shared
+
+    @classmethod
+    def expand(cls, state_paths):
+        """A state file, a directory of state files or a list of both, as a list of state files"""
+        if isinstance(state_paths, (str, Path)):
+            state_paths = [state_paths]
+        expanded = []
+        for state_path in state_paths:
+            state_path = Path(state_path)
+            if state_path.is_dir():
+                expanded += sorted(state_path.glob(f"*{cls.STATE_SUFFIX}"))
+            else:
+                expanded.append(state_path)
+        if not expanded:
+            raise ValueError(f"No save states found in {state_paths}")
+        return [str(p) for p in expanded]
+
+    def warmup(self, state_paths):
+        """Load every state of a pool, after this no resets touch the disk"""
+        for state_path in state_paths:
+            self.load(state_path)
+
+    def load(self, state_path):
+        key = os.path.abspath(state_path)
+        if key not in self.blobs:
+            blob = self.load_shared(key) if self.shared else None
+            if blob is None:
+                with open(key, "rb") as f:
+                    blob = f.read()
+                if self.shared:
+                    self.publish(key, blob)
+            self.blobs[key] = blob
+        return self.blobs[key]
+
+    def shm_name(self, key):
+        return self.SHM_PREFIX + hashlib.sha1(key.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def attach(name):
+        """Open a block published by another process, see SharedBlock.attach"""
+        return SharedBlock.attach(name)
+
+    def load_shared(self, key):
+        try:
+            block = self.attach(self.shm_name(key))
+        except FileNotFoundError:
+            return None
+        try:
+            length = int.from_bytes(block.buf[: self.HEADER_SIZE], "little")
+            if length == 0:
+                # Still being written by another worker
+                return None
+            return bytes(block.buf[self.HEADER_SIZE : self.HEADER_SIZE + length])
+        finally:
+            block.close()
+
+    def publish(self, key, blob):
+        try:
+            block = shared_memory.SharedMemory(
+                name=self.shm_name(key), create=True, size=self.HEADER_SIZE + len(blob)
+            )
+        except FileExistsError:
+            # Another worker was faster
+            return
+        block.buf[self.HEADER_SIZE : self.HEADER_SIZE + len(blob)] = blob
+        block.buf[: self.HEADER_SIZE] = len(blob).to_bytes(self.HEADER_SIZE, "little")
+        self.published[key] = block
+        atexit.register(self.unpublish, key)
+
+    def unpublish(self, key):
+        block = self.published.pop(key, None)
+        if block:
+            block.close()
+            block.unlink()
+
+
+__all__ = ["StateCache"]
@@ -0,0 +1,68 @@
+import json
+import time
+
+from LatencyHistogram import LatencyHistogram
+
+
+class StepTimer:
+    """Wall time of the phases of RedGymEnv.step, one LatencyHistogram per phase.
+
+    start() at the beginning of a step, lap(phase) at the end of every phase
+    and stop() at the end of the step. Every `interval` steps stop() returns a
+    summary of all steps so far (and writes it to summary_path, if given).
+    """
+
+    PHASES = ("emulation", "stats", "downscale", "rewards", "observation", "recording", "step")
+
+    def __init__(self, interval=1000, summary_path=None):
+        self.interval = interval
+        self.summary_path = summary_path
+        self.histograms = {
+            phase: LatencyHistogram(min_seconds=1e-6, max_seconds=1.0) for phase in self.PHASES
+        }
+        self.steps = 0
+        self.step_start = self.last = time.perf_counter()
+
+    def start(self):
+        self.step_start = self.last = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.histograms[phase].add(now - self.last)
+        self.last = now
+
+    def stop(self):
+        self.histograms["step"].add(time.perf_counter() - self.step_start)
+        self.steps += 1
+        if self.steps % self.interval:
+            return None
+        summary = self.summary()
+        if self.summary_path is not None:
+            with open(self.summary_path, "w") as f:
+                json.dump(summary, f, indent=2)
+        return summary
+
+    def summary(self):
+        return {
+            "steps": self.steps,
+            "phases": {phase: histogram.summary() for phase, histogram in self.histograms.items()},
+        }
+
+
+class NullTimer:
+    """Stand-in for StepTimer when timing is disabled, every call does nothing"""
+
+    def start(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def stop(self):
+        return None
+
+    def summary(self):
+        return None
+
+
+__all__ = ["NullTimer", "StepTimer"]
@@ -0,0 +1,247 @@
+import json
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+SCHEMA_FILE = "schema.json"
+EPISODES_FILE = "episodes.bin"
+EPISODE_DTYPE = np.dtype([("start", "<i8"), ("length", "<i8"), ("seed", "<i8")])
+KEYFRAMES_FILE = "keyframes.bin"
+KEYFRAME_STATES_FILE = "keyframes.blob"
+# The state is the emulator before the action of `row`, crc is its RAM checksum
+KEYFRAME_DTYPE = np.dtype(
+    [("row", "<i8"), ("offset", "<i8"), ("length", "<i8"), ("crc", "<u4")]
+)
+
+
+def column_file(path, name):
+    return Path(path) / f"{name}.bin"
+
+
+class TrajectoryLogWriter:
+    """Append-only columnar log of the steps of one env.
+
+    Every column is a raw file of fixed size rows (dtype and shape are in
+    schema.json), so a reader can memory map it. Rows are collected in
+    chunks of chunk_steps and appended when a chunk is full or an episode
+    ends. episodes.bin indexes the episodes (start row, length, seed), an
+    episode is only indexed after its rows are written.
+    """
+
+    def __init__(self, path, columns, chunk_steps=1024):
+        """columns: {name: (dtype, shape)}. An existing log with the same columns is appended to."""
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.columns = {
+            name: (np.dtype(dtype), tuple(shape)) for name, (dtype, shape) in columns.items()
+        }
+        schema = {
+            "columns": {
+                name: {"dtype": dtype.str, "shape": list(shape)}
+                for name, (dtype, shape) in self.columns.items()
+            },
+            "episode_dtype": EPISODE_DTYPE.descr,
+        }
+        schema_path = self.path / SCHEMA_FILE
+        if schema_path.exists():
+            with open(schema_path) as f:
+                if json.load(f)["columns"] != schema["columns"]:
+                    raise ValueError(f"{self.path} has a log with different columns")
+        else:
+            with open(schema_path, "w") as f:
+                json.dump(schema, f, indent=2)
+
+        self.chunk_steps = chunk_steps
+        self.chunk = {
+            name: np.zeros((chunk_steps, *shape), dtype=dtype)
+            for name, (dtype, shape) in self.columns.items()
+        }
+        self.filled = 0
+        # Rows already in the files, the shortest column wins if a write was cut off
+        self.steps = TrajectoryLogReader.count_rows(self.path, self.columns)
+        for name, (dtype, shape) in self.columns.items():
+            file = column_file(self.path, name)
+            if file.exists():
+                with open(file, "r+b") as f:
+                    f.truncate(self.steps * dtype.itemsize * int(np.prod(shape)))
+        self.truncate_episodes()
+        self.episode_start = self.steps
+
+    def truncate_episodes(self):
+        """Drop the episodes (and a partly written one) past the rows left in the columns"""
+        file = self.path / EPISODES_FILE
+        if not file.exists():
+            return
+        episodes = read_episodes(self.path)
+        kept = episodes[episodes["start"] + episodes["length"] <= self.steps]
+        if kept.nbytes != file.stat().st_size:
+            file.write_bytes(kept.tobytes())
+
+    @property
+    def next_row(self):
+        """Row the next append() will have in the log"""
+        return self.steps + self.filled
+
+    def append(self, **values):
+        """Add one row, every column has to be given"""
+        for name, value in values.items():
+            self.chunk[name][self.filled] = value
+        self.filled += 1
+        if self.filled == self.chunk_steps:
+            self.flush()
+
+    def flush(self):
+        if self.filled == 0:
+            return
+        for name, rows in self.chunk.items():
+            with open(column_file(self.path, name), "ab") as f:
+                f.write(rows[: self.filled].tobytes())
+        self.steps += self.filled
+        self.filled = 0
+
+    def end_episode(self, seed=0):
+        """Write the rows of the current episode and add it to the index"""
+        self.flush()
+        length = self.steps - self.episode_start
+        if length > 0:
+            episode = np.array([(self.episode_start, length, seed)], dtype=EPISODE_DTYPE)
+            with open(self.path / EPISODES_FILE, "ab") as f:
+                f.write(episode.tobytes())
+        self.episode_start = self.steps
+
+    def close(self, seed=0):
+        self.end_episode(seed)
+
+
+class KeyframeWriter:
+    """Savestates of the emulator next to a trajectory log, for seeking in it.
+
+    The zlib compressed states are appended to keyframes.blob and indexed in
+    keyframes.bin (KEYFRAME_DTYPE). Keyframes of rows the log does not have
+    (any more) are dropped when it is reopened. Entries without a state
+    (length 0, see add_checksum) only record the RAM checksum at the end of
+    an episode, their row is the one after its last step.
+    """
+
+    def __init__(self, path, rows):
+        """rows: the rows of the log that are written, see TrajectoryLogWriter.steps"""
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        index = read_keyframes(self.path)
+        index = index[keyframe_in_log(index, rows)]
+        end = int(index["offset"][-1] + index["length"][-1]) if len(index) else 0
+        with open(self.path / KEYFRAMES_FILE, "wb") as f:
+            f.write(index.tobytes())
+        with open(self.path / KEYFRAME_STATES_FILE, "ab") as f:
+            f.truncate(end)
+        self.offset = end
+
+    def add(self, row, state, crc):
+        data = zlib.compress(state, 1)
+        with open(self.path / KEYFRAME_STATES_FILE, "ab") as f:
+            f.write(data)
+        # The index entry is written last, so it only ever points at a complete state
+        self.write_entry(row, len(data), crc)
+        self.offset += len(data)
+
+    def add_checksum(self, row, crc):
+        """The RAM checksum after the action of row - 1, without a state"""
+        self.write_entry(row, 0, crc)
+
+    def write_entry(self, row, length, crc):
+        keyframe = np.array([(row, self.offset, length, crc)], dtype=KEYFRAME_DTYPE)
+        with open(self.path / KEYFRAMES_FILE, "ab") as f:
+            f.write(keyframe.tobytes())
+
+
+def keyframe_in_log(keyframes, rows):
+    """Mask of the keyframes of a log of rows rows, checksums can be at the row after the last"""
+    return (keyframes["row"] < rows) | ((keyframes["length"] == 0) & (keyframes["row"] == rows))
+
+
+def read_episodes(path):
+    """The complete entries of episodes.bin, a write that was cut off is ignored"""
+    file = Path(path) / EPISODES_FILE
+    if not file.exists():
+        return np.zeros(0, dtype=EPISODE_DTYPE)
+    data = file.read_bytes()
+    return np.frombuffer(data[: len(data) - len(data) % EPISODE_DTYPE.itemsize], EPISODE_DTYPE)
+
+
+def read_keyframes(path):
+    file = Path(path) / KEYFRAMES_FILE
+    if not file.exists():
+        return np.zeros(0, dtype=KEYFRAME_DTYPE)
+    return np.fromfile(file, dtype=KEYFRAME_DTYPE)
+
+
+class TrajectoryLogReader:
+    """Columns of a TrajectoryLogWriter log as read only memory maps, nothing is parsed"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path / SCHEMA_FILE) as f:
+            schema = json.load(f)
+        self.columns = {
+            name: (np.dtype(column["dtype"]), tuple(column["shape"]))
+            for name, column in schema["columns"].items()
+        }
+        self.steps = self.count_rows(self.path, self.columns)
+        self.maps = {}
+
+    @staticmethod
+    def count_rows(path, columns):
+        counts = []
+        for name, (dtype, shape) in columns.items():
+            file = column_file(path, name)
+            row_size = dtype.itemsize * int(np.prod(shape))
+            counts.append(file.stat().st_size // row_size if file.exists() else 0)
+        return min(counts, default=0)
+
+    def __getitem__(self, name):
+        """The whole column, shape (steps, *shape)"""
+        if name not in self.maps:
+            dtype, shape = self.columns[name]
+            if self.steps == 0:
+                self.maps[name] = np.zeros((0, *shape), dtype=dtype)
+            else:
+                self.maps[name] = np.memmap(
+                    column_file(self.path, name), dtype=dtype, mode="r", shape=(self.steps, *shape)
+                )
+        return self.maps[name]
+
+    def __len__(self):
+        return self.steps
+
+    @property
+    def episodes(self):
+        """Structured array with start, length and seed of every finished episode"""
+        episodes = read_episodes(self.path)
+        return episodes[episodes["start"] + episodes["length"] <= self.steps]
+
+    def episode(self, index):
+        """{column: rows of the episode}, views into the memory maps"""
+        start, length, _ = self.episodes[index]
+        return {name: self[name][start : start + length] for name in self.columns}
+
+    @property
+    def keyframes(self):
+        """Index of the keyframes (see KeyframeWriter) of the rows in the log, by row"""
+        keyframes = read_keyframes(self.path)
+        return keyframes[keyframe_in_log(keyframes, self.steps)]
+
+    def keyframe_state(self, keyframe):
+        """The savestate bytes of an entry of keyframes"""
+        with open(self.path / KEYFRAME_STATES_FILE, "rb") as f:
+            f.seek(int(keyframe["offset"]))
+            return zlib.decompress(f.read(int(keyframe["length"])))
+
+    @classmethod
+    def open_session(cls, session_path):
+        """Readers of the logs of all envs of a session, by instance id"""
+        logs = sorted(Path(session_path).glob(f"trajectories/*/{SCHEMA_FILE}"))
+        return {log.parent.name: cls(log.parent) for log in logs}
+
+
+__all__ = ["KeyframeWriter", "TrajectoryLogReader", "TrajectoryLogWriter"]
@@ -0,0 +1,314 @@
+import multiprocessing as mp
+import threading
+import time
+from multiprocessing import shared_memory
+from multiprocessing.connection import Client, Listener, wait
+
+import numpy as np
+
+import SharedBlock
+from FrameCodec import decode_frame, is_packed
+
+DEFAULT_AUTHKEY = b"pokered-video"
+
+
+def to_rgb(frame):
+    """What mediapy can encode: RGB, or 2D for grayscale"""
+    if is_packed(frame):
+        return decode_frame(frame, channels=1)[:, :, 0]
+    if frame.ndim == 3 and frame.shape[2] == 4:
+        return frame[:, :, :3]
+    if frame.ndim == 3 and frame.shape[2] == 1:
+        return frame[:, :, 0]
+    return frame
+
+
+class EncoderStream:
+    """The videos of one connected env, its frames arrive in a shared memory ring of that env"""
+
+    def __init__(self):
+        self.block = None
+        self.frames = None
+        self.writer = None
+        self.video = None
+        self.encoded = 0
+        self.videos = 0
+
+    def open(self, path, name, shape, slots, fps):
+        self.finish()
+        if self.block is None or self.block.name != name:
+            self.detach()
+            # The env owns the ring, the encoder must not unlink it
+            self.block = SharedBlock.attach(name)
+            self.frames = np.ndarray((slots, *shape), dtype=np.uint8, buffer=self.block.buf)
+        # The writer (and its ffmpeg process) is only started with the first frame
+        self.video = (path, fps)
+
+    def encode(self, slot):
+        if self.writer is None:
+            import mediapy as media
+
+            path, fps = self.video
+            self.writer = media.VideoWriter(path, to_rgb(self.frames[0]).shape[:2], fps=fps)
+            self.writer.__enter__()
+        self.writer.add_image(to_rgb(self.frames[slot]))
+        self.encoded += 1
+
+    def finish(self):
+        self.video = None
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.videos += 1
+
+    def detach(self):
+        self.finish()
+        self.frames = None
+        if self.block is not None:
+            self.block.close()
+            self.block = None
+
+
+def encode(ready, address, authkey):
+    """Encoder loop: writes the videos of all connected envs, one stream per connection"""
+    listener = Listener(address, authkey=authkey)
+    ready.send(listener.address)
+    ready.close()
+
+    streams = {}
+    connections = []
+    lock = threading.Lock()
+    # videos only counts the streams that disconnected, stats adds the connected ones
+    stats = {"frames": 0, "dropped": 0, "videos": 0, "encode_seconds": 0.0}
+
+    def accept():
+        while True:
+            try:
+                connection = listener.accept()
+            except OSError:
+                return
+            with lock:
+                connections.append(connection)
+                streams[connection] = EncoderStream()
+
+    threading.Thread(target=accept, daemon=True).start()
+
+    while True:
+        with lock:
+            current = list(connections)
+        for connection in wait(current, timeout=0.05) if current else []:
+            try:
+                command, data = connection.recv()
+            except (EOFError, OSError):
+                command, data = "disconnect", None
+
+            stream = streams[connection]
+            if command == "frames":
+                start = time.perf_counter()
+                for slot in data:
+                    stream.encode(slot)
+                stats["encode_seconds"] += time.perf_counter() - start
+                stats["frames"] += len(data)
+                # The slots can be written again
+                connection.send(("ack", data))
+            elif command == "open":
+                stream.open(**data)
+            elif command == "finish":
+                stream.finish()
+                stats["dropped"] += data
+            elif command == "close":
+                stream.detach()
+                connection.send(("closed", stream.encoded))
+            elif command == "stats":
+                videos = stats["videos"] + sum(other.videos for other in streams.values())
+                recording = sum(other.writer is not None for other in streams.values())
+                connection.send(("stats", {**stats, "videos": videos, "recording": recording}))
+            elif command == "disconnect":
+                stream.detach()
+                stats["videos"] += stream.videos
+                connection.close()
+                with lock:
+                    connections.remove(connection)
+                    del streams[connection]
+            elif command == "shutdown":
+                for other in streams.values():
+                    other.detach()
+                connection.send(("shutdown", True))
+                listener.close()
+                return
+        if not current:
+            time.sleep(0.05)
+
+
+class VideoEncoderPool:
+    """A few encoder processes that write the videos of all rollout workers.
+
+    Envs stream raw frames to an encoder with a VideoStream, so the mp4
+    encoding does not run in the env process. Every encoder handles the
+    streams of several envs. Pass `addresses` (after start()) to the workers,
+    an env uses addresses[rank % len(addresses)].
+    """
+
+    def __init__(self, num_encoders=2, host="localhost", authkey=DEFAULT_AUTHKEY):
+        self.num_encoders = num_encoders
+        self.host = host
+        self.authkey = authkey
+        self.addresses = []
+        self.processes = []
+
+    def start(self):
+        ctx = mp.get_context("spawn")
+        for _ in range(self.num_encoders):
+            ready, child_ready = ctx.Pipe(duplex=False)
+            process = ctx.Process(
+                target=encode, args=(child_ready, (self.host, 0), self.authkey), daemon=True
+            )
+            process.start()
+            child_ready.close()
+            self.addresses.append(ready.recv())
+            self.processes.append(process)
+        return self.addresses
+
+    def request(self, address, command):
+        connection = Client(address, authkey=self.authkey)
+        connection.send((command, None))
+        reply = connection.recv()[1]
+        if command != "shutdown":
+            connection.send(("disconnect", None))
+        connection.close()
+        return reply
+
+    def stats(self):
+        """Frames encoded and dropped (by finished videos), videos finished and being recorded"""
+        total = {}
+        for address in self.addresses:
+            for key, value in self.request(address, "stats").items():
+                total[key] = total.get(key, 0) + value
+        return total
+
+    def stop(self):
+        for address, process in zip(self.addresses, self.processes):
+            if process.is_alive():
+                self.request(address, "shutdown")
+            process.join()
+        self.addresses = []
+        self.processes = []
+
+
+class VideoStream:
+    """Frames of the videos of one env, sent to a VideoEncoderPool encoder through shared memory.
+
+    start(path) begins a video, add() copies a frame into a free slot of a
+    ring in shared memory and finish() ends the video, none of them wait for
+    the encoder. Slot numbers are sent `batch` at a time (every message
+    wakes the encoder up) and acked when the frames are written. When no slot
+    is free, the frame is dropped (counted in `dropped`) instead of waiting.
+    The connection and the ring are reused by all videos until close().
+    """
+
+    def __init__(self, address, fps=60, slots=64, batch=4, authkey=DEFAULT_AUTHKEY):
+        self.address = address
+        self.fps = fps
+        self.slots = slots
+        self.batch = min(batch, slots)
+        self.authkey = authkey
+        self.connection = None
+        self.block = None
+        self.frames = None
+        self.free = []
+        self.pending = []
+        self.path = None
+        self.recording = False
+        self.sent = 0
+        self.dropped = 0
+        self.video_dropped = 0
+
+    def start(self, path):
+        """Begin a new video, the encoder is told with the first frame"""
+        self.finish()
+        self.path = str(path)
+
+    def open(self, shape):
+        if self.connection is None:
+            self.connection = Client(self.address, authkey=self.authkey)
+        if self.frames is None:
+            self.block = shared_memory.SharedMemory(
+                create=True, size=self.slots * int(np.prod(shape))
+            )
+            self.frames = np.ndarray((self.slots, *shape), dtype=np.uint8, buffer=self.block.buf)
+            self.free = list(range(self.slots))
+        elif self.frames.shape[1:] != shape:
+            raise ValueError(f"Frame shape {shape} but the stream has {self.frames.shape[1:]}")
+        config = {
+            "path": self.path,
+            "name": self.block.name,
+            "shape": shape,
+            "slots": self.slots,
+            "fps": self.fps,
+        }
+        self.connection.send(("open", config))
+        self.recording = True
+        self.video_dropped = 0
+
+    def receive(self, expected):
+        """Wait for the reply to a command, collecting the acks that arrive before it"""
+        while True:
+            tag, data = self.connection.recv()
+            if tag == expected:
+                return data
+            self.free.extend(data)
+
+    def add(self, frame):
+        """Queue the frame for encoding, returns False if it was dropped"""
+        if not self.recording:
+            if self.path is None:
+                raise ValueError("start() a video before adding frames")
+            self.open(frame.shape)
+        while self.connection.poll():
+            self.free.extend(self.connection.recv()[1])
+        if not self.free:
+            self.flush()
+            self.dropped += 1
+            self.video_dropped += 1
+            return False
+        slot = self.free.pop()
+        self.frames[slot] = frame
+        self.pending.append(slot)
+        if len(self.pending) >= self.batch:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Send the frames that are not sent yet to the encoder"""
+        if self.pending:
+            self.connection.send(("frames", self.pending))
+            self.sent += len(self.pending)
+            self.pending = []
+
+    def finish(self):
+        """End the current video, the encoder writes the rest of it in the background"""
+        if self.recording:
+            self.flush()
+            self.connection.send(("finish", self.video_dropped))
+            self.recording = False
+        self.path = None
+
+    def close(self):
+        """Finish the video and wait for the encoder, returns the number of frames it wrote"""
+        self.finish()
+        if self.connection is None:
+            return 0
+        self.connection.send(("close", None))
+        encoded = self.receive("closed")
+        self.connection.send(("disconnect", None))
+        self.connection.close()
+        self.connection = None
+        if self.block is not None:
+            self.frames = None
+            self.block.close()
+            self.block.unlink()
+            self.block = None
+        return encoded
+
+
+__all__ = ["VideoEncoderPool", "VideoStream"]
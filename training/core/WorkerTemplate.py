@@ -0,0 +1,110 @@
+import json
+import multiprocessing as mp
+import os
+from multiprocessing import forkserver
+
+TEMPLATE_CONFIG_VAR = "POKE_TEMPLATE_CONFIG"
+# Settings that differ between workers, they are applied by make_env
+PER_WORKER_KEYS = ("rank", "seed", "instance_id")
+# Imported by the forkserver: the worker loop and everything it imports, and the module
+# that builds the template there
+PRELOAD_MODULES = ["SharedMemoryVecEnv", "WorkerTemplatePreload"]
+
+# (key, env) once built in this process, see ensure_built
+template = None
+built = False
+
+
+def template_key(config):
+    """The config as a string, equal for the configs of all workers of a run"""
+    shared = {key: value for key, value in config.items() if key not in PER_WORKER_KEYS}
+    return json.dumps(shared, sort_keys=True, default=str)
+
+
+def preload(config):
+    """Start the forkserver with a template env of config, that the workers are forked from.
+
+    Call it before the first forkserver process is started (before creating
+    the vec env), later calls have no effect. The forkserver imports
+    WorkerTemplatePreload, which builds a RedGymEnv of the config once, with
+    pyboy, hnswlib, sb3 and torch imported. Every worker starts with all of
+    that in memory, shared copy-on-write with the other workers, and make_env
+    only applies the per rank settings to its copy of the template.
+    """
+    mp.get_context("forkserver").set_forkserver_preload(PRELOAD_MODULES)
+    # The forkserver gets the config and the core dir from its environment (it does not
+    # get our sys.path and skips modules it can't import), ours is only changed while it starts
+    core_path = os.path.dirname(os.path.abspath(__file__))
+    python_path = os.environ.get("PYTHONPATH")
+    saved = {TEMPLATE_CONFIG_VAR: os.environ.get(TEMPLATE_CONFIG_VAR), "PYTHONPATH": python_path}
+    os.environ[TEMPLATE_CONFIG_VAR] = template_key(config)
+    os.environ["PYTHONPATH"] = core_path + (os.pathsep + python_path if python_path else "")
+    try:
+        forkserver.ensure_running()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def build():
+    from RedGymEnv import RedGymEnv
+
+    key = os.environ.get(TEMPLATE_CONFIG_VAR)
+    if key is None:
+        return None
+    try:
+        return key, RedGymEnv(json.loads(key), reset=False)
+    except Exception as e:
+        # The forkserver would not start, the workers build their own env instead
+        print(f"Could not build the worker template env: {e!r}")
+        return None
+
+
+def ensure_built():
+    """Build the template env of the preloaded config, once per process. Only the
+    forkserver (and the workers forked from it) have a config to build it from."""
+    global template, built
+    if not built:
+        built = True
+        template = build()
+
+
+def take(config):
+    """The template env if it was built from config, only once per worker process"""
+    global template
+    ensure_built()
+    if template is None or template[0] != template_key(config):
+        return None
+    env = template[1]
+    template = None
+    return env
+
+
+def process_memory(pid="self"):
+    """Resident memory of a process in bytes: rss, and pss (pages shared with other
+    processes count in part) if the kernel has smaps_rollup"""
+    memory = {"rss": None, "pss": None}
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                memory["rss"] = int(line.split()[1]) * 1024
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    memory["pss"] = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return memory
+
+
+def worker_memory(vec_env):
+    """process_memory of every worker of a SubprocVecEnv or SharedMemoryVecEnv, none for
+    vec envs without worker processes"""
+    return [process_memory(process.pid) for process in getattr(vec_env, "processes", ())]
+
+
+__all__ = ["ensure_built", "preload", "process_memory", "take", "worker_memory"]
@@ -0,0 +1,5 @@
+# Only imported by the forkserver (see WorkerTemplate.preload), builds the template env there
+# before the workers are forked from the server
+import WorkerTemplate
+
+WorkerTemplate.ensure_built()
@@ -11,11 +11,12 @@ class PokePolicy(nn.Module):
         super(PokePolicy, self).__init__()
 
         # Define the CNN for image input
-        self.features_extractor = NatureCNN(observation_space, features_dim)
+        # observation_space is the Dict space of RedGymEnv with observation_mode "dict"
+        self.features_extractor = NatureCNN(observation_space["frame"], features_dim)
 
-        # Define the embedding layer for Pokemon types
-        # 152 types, 10-dimensional embedding
-        self.embedding = nn.Embedding(152, 10)
+        # Define the embedding layer for Pokemon species
+        # The first 6 stats are the party's internal species ids, which are one byte
+        self.embedding = nn.Embedding(256, 10)
 
         # Fully connected layer to combine features
         self.fc_combined = nn.Linear(
@@ -42,7 +43,7 @@ class PokePolicy(nn.Module):
         # One for each pokemon
         embeddings = []
         for i in range(6):
-            embeddings.append(self.embedding(stats[:, i]))
+            embeddings.append(self.embedding(stats[:, i].long()))
 
         embeddings_vec = torch.cat(embeddings, dim=1)
 
@@ -6,6 +6,10 @@ import matplotlib.pyplot as plt
 import mediapy as media
 import numpy as np
 
+# Moved to core, imported here for scripts that still use it from here
+from ScreenshotRecorder import ScreenshotRecorder
+from VideoEncoderPool import to_rgb
+
 class Recorder:
     def __init__(self, path, format='gif', fps=1): # Format can be gif, png, mp4
         self.path = path
@@ -25,35 +29,16 @@ class Recorder:
             self.writer = media.VideoWriter(self.path, fps=self.fps)
         self.writer.__enter__()
         
-class ScreenshotRecorder():
-    def __init__(self, path, skip=0):
-        self.path = path
-        if not type(self.path) == Path:
-            self.path = Path(self.path)
-        self.path.mkdir(exist_ok=True)
-        self.count = 0
-        self.skip = skip
-        self.skipped = 0
-        
-    def add(self, frame, note=None):
-        self.count += 1
-        if self.skipped < self.skip:
-            self.skipped += 1
-            return
-        self.skipped = 0
-        
-        note = "_" + note if note else ''
-        filename = f"frame{self.count}{note}.png"
-
-        
-        if frame.shape[2] == 1:
-            frame = np.repeat(frame, 3, axis=2)
-        
-        plt.imsave(self.path / Path(filename), frame) 
-            
 class PokeRecorder:
     def __init__(
-        self, session_path, instance_id, ml_res, renderFull, renderModel, reset_count=0
+        self,
+        session_path,
+        instance_id,
+        ml_res,
+        renderFull=None,
+        renderModel=None,
+        reset_count=0,
+        streams=(None, None),
     ):
         base_dir = session_path / Path("rollouts")
         base_dir.mkdir(exist_ok=True)
@@ -63,13 +48,14 @@ class PokeRecorder:
         model_name = Path(
             f"{base_dir}/model_reset_{reset_count}_id{instance_id}"
         ).with_suffix(".mp4")
-        self.full_recorder = VideoRecorder(full_name, (144, 160), renderFull)
-        self.model_recorder = VideoRecorder(model_name, ml_res[:2], renderModel)
+        # With VideoStreams (full, model), the videos are encoded by a VideoEncoderPool
+        self.full_recorder = VideoRecorder(full_name, (144, 160), renderFull, stream=streams[0])
+        self.model_recorder = VideoRecorder(model_name, ml_res[:2], renderModel, stream=streams[1])
         self.all_runs = []
 
-    def add_video_frame(self):
-        self.full_recorder.add_video_frame()
-        self.model_recorder.add_video_frame()
+    def add_video_frame(self, full_frame=None, model_frame=None):
+        self.full_recorder.add_video_frame(full_frame)
+        self.model_recorder.add_video_frame(model_frame)
 
     def finish_video(self):
         self.full_recorder.finish_video()
@@ -136,13 +122,29 @@ class PokeRecorder:
 
 
 class VideoRecorder:
-    def __init__(self, path, resolution, render, fps=60):
-        self.writer = media.VideoWriter(path, resolution, fps=fps)
-        self.writer.__enter__()
-        self.render = render
+    """mp4 of the added frames, encoded here, or by a VideoEncoderPool encoder if a VideoStream is given"""
 
-    def add_video_frame(self):
-        self.writer.add_image(self.render)
+    def __init__(self, path, resolution, render=None, fps=60, stream=None):
+        self.render = render
+        self.stream = stream
+        self.writer = None
+        if stream is not None:
+            stream.start(path)
+        else:
+            self.writer = media.VideoWriter(path, resolution, fps=fps)
+            self.writer.__enter__()
+
+    def add_video_frame(self, frame=None):
+        """Add frame, or the frame returned by render"""
+        if frame is None:
+            frame = self.render() if callable(self.render) else self.render
+        if self.stream is not None:
+            self.stream.add(frame)
+        else:
+            self.writer.add_image(to_rgb(frame))
 
     def finish_video(self):
-        self.writer.close()
+        if self.stream is not None:
+            self.stream.finish()
+        else:
+            self.writer.close()
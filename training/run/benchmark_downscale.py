@@ -0,0 +1,70 @@
+import argparse
+import sys
+import timeit
+
+import numpy as np
+from skimage.transform import resize
+
+sys.path.append("../core")
+from Downscaler import Downscaler
+from GameFrames import game_like_frames
+
+
+def skimage_downscale(frame):
+    """The previous scaling of EnvInputConstructor.scale_frame and PokeRedRewarder.add_to_knn"""
+    scaled = (255 * resize(frame, (36, 40), anti_aliasing=True)).astype(np.uint8)
+    return scaled[:, :, :1]
+
+
+def emulator_frames(gb_path, state, count, seed):
+    from PokeRed import PokeRed
+
+    poke_red = PokeRed(gb_path, state_file=state, hide_window=True)
+    rng = np.random.default_rng(seed)
+    frames = []
+    for action in rng.integers(0, len(PokeRed.VALID_ACTIONS), size=count):
+        poke_red.run_action(action)
+        frames.append(poke_red.get_screen().copy())
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Parity and speed of the block mean Downscaler against skimage resize"
+    )
+    parser.add_argument("--gb-path", help="use emulator frames instead of synthetic ones")
+    parser.add_argument("--state", default="../../states/has_pokedex_nballs.state")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.gb_path:
+        frames = emulator_frames(args.gb_path, args.state, args.frames, args.seed)
+    else:
+        frames = game_like_frames(args.frames, args.seed)
+
+    downscaler = Downscaler()
+    diffs = np.stack(
+        [
+            np.abs(
+                downscaler.downscale(frame).astype(np.int16)
+                - skimage_downscale(frame).astype(np.int16)
+            )
+            for frame in frames
+        ]
+    )
+    print(f"mean abs diff:     {diffs.mean():8.3f}")
+    print(f"max abs diff:      {diffs.max():8d}")
+    print(f"pixels within 8:   {(diffs <= 8).mean() * 100:7.2f}%")
+
+    frame = frames[0]
+    number = 2000
+    skimage_time = timeit.timeit(lambda: skimage_downscale(frame), number=number) / number
+    block_time = timeit.timeit(lambda: downscaler.downscale(frame), number=number) / number
+    print(f"skimage resize:    {skimage_time * 1e6:8.1f} us")
+    print(f"block mean:        {block_time * 1e6:8.1f} us")
+    print(f"speedup:           {skimage_time / block_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
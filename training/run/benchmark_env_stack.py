@@ -0,0 +1,263 @@
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append("../core")
+from EnvInputConstructor import EnvInputConstructor
+from PokeRed import PokeRed
+from PokeRedRewarder import PokeRedRewarder
+
+LAYERS = ("ticking", "stats", "rewarder", "observation", "env", "vec_env")
+
+
+def load_trace(path, steps, seed):
+    """Actions from a trajectory log directory, a .npy file, a csv(.gz) with a last_action column
+    or a text file with one action per line. Without a path, a random trace from seed."""
+    if path is None:
+        actions = np.random.default_rng(seed).integers(0, len(PokeRed.VALID_ACTIONS), size=steps)
+    elif Path(path).is_dir():
+        from TrajectoryLog import TrajectoryLogReader
+
+        actions = np.asarray(TrajectoryLogReader(path)["action"])
+    elif path.endswith(".npy"):
+        actions = np.load(path)
+    elif path.endswith((".csv", ".csv.gz")):
+        import pandas as pd
+
+        actions = pd.read_csv(path)["last_action"].to_numpy()
+    else:
+        actions = np.loadtxt(path, dtype=np.int64, ndmin=1)
+    actions = actions.astype(np.int64)
+    if len(actions) < steps:
+        # Repeat short traces, so every layer runs the same number of steps
+        actions = np.resize(actions, steps)
+    return actions[:steps]
+
+
+def file_sha1(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def emulator_pipeline(layer, gb_path, state):
+    """One step function running the emulator layers up to and including layer"""
+    poke_red = PokeRed(gb_path, hide_window=True)
+    poke_red.load_from_state(state)
+    rewarder = PokeRedRewarder()
+    constructor = EnvInputConstructor()
+    depth = LAYERS.index(layer)
+
+    def step(action):
+        poke_red.run_action(action)
+        if depth < 1:
+            return
+        stats, frame = poke_red.get_all_stats(), poke_red.get_screen()
+        if depth < 2:
+            return
+        scaled_frame = constructor.scale_frame(frame)
+        rewards = rewarder.update_rewards(stats, scaled_frame)
+        if depth < 3:
+            return
+        constructor.render_for_ml(stats, scaled_frame, rewards)
+
+    return step
+
+
+def env_config(args, session_path, max_steps):
+    return {
+        "headless": True,
+        "save_final_state": False,
+        "early_stop": False,
+        "action_freq": 24,
+        "init_state": args.state,
+        "max_steps": max_steps,
+        "print_rewards": False,
+        "save_video": False,
+        "fast_video": True,
+        "session_path": session_path,
+        "gb_path": args.gb_path,
+        "debug": False,
+        "rank": 0,
+    }
+
+
+def run_steps(step, actions, track_allocations):
+    """Time step over actions; with track_allocations, also the traced memory of every step.
+
+    Tracing slows every allocation down, so it is done in a separate pass from the timing.
+    """
+    if not track_allocations:
+        start = time.perf_counter()
+        for action in actions:
+            step(action)
+        return time.perf_counter() - start, None
+
+    tracemalloc.start()
+    peaks = np.zeros(len(actions), dtype=np.int64)
+    first, _ = tracemalloc.get_traced_memory()
+    for i, action in enumerate(actions):
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        step(action)
+        _, peak = tracemalloc.get_traced_memory()
+        peaks[i] = peak - current
+    last, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return None, {
+        # Highest memory above the start of the step, i.e. the temporaries of one step
+        "peak_bytes_per_step": float(peaks.mean()),
+        "max_peak_bytes": int(peaks.max()),
+        # Memory kept after the steps, e.g. archives and caches growing
+        "retained_bytes_per_step": (last - first) / len(actions),
+    }
+
+
+def measure(name, make_step, actions, warmup, allocations):
+    step = make_step()
+    for action in actions[:warmup]:
+        step(action)
+    elapsed, _ = run_steps(step, actions, False)
+    result = {
+        "layer": name,
+        "workers": 1,
+        "steps": len(actions),
+        "steps_per_second": len(actions) / elapsed,
+        "us_per_step": elapsed / len(actions) * 1e6,
+    }
+    if allocations:
+        # A fresh pipeline, so the allocation pass replays the same steps
+        step = make_step()
+        for action in actions[:warmup]:
+            step(action)
+        result["allocations"] = run_steps(step, actions, True)[1]
+    return result
+
+
+def measure_vec_env(args, actions, num_envs, session_path):
+    from RedGymEnv import make_env
+    from SharedMemoryVecEnv import SharedMemoryVecEnv
+
+    config = env_config(args, session_path, max_steps=len(actions) + args.warmup + 1)
+    vec_env = SharedMemoryVecEnv([make_env(i, config, seed=args.seed + 1) for i in range(num_envs)])
+    try:
+        vec_env.reset()
+        # Every worker runs the trace, shifted by its rank so they don't move in lockstep
+        trace = np.stack([np.roll(actions, rank) for rank in range(num_envs)], axis=1)
+        for step_actions in trace[: args.warmup]:
+            vec_env.step(step_actions)
+        start = time.perf_counter()
+        for step_actions in trace:
+            vec_env.step(step_actions)
+        elapsed = time.perf_counter() - start
+        latency = vec_env.latency_stats()["all"]
+    finally:
+        vec_env.close()
+    steps = len(actions) * num_envs
+    return {
+        "layer": "vec_env",
+        "workers": num_envs,
+        "steps": steps,
+        "steps_per_second": steps / elapsed,
+        "us_per_step": elapsed / steps * 1e6,
+        "worker_step_seconds": latency,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Throughput and allocations of every layer of the env stack, as JSON"
+    )
+    parser.add_argument("--gb-path", required=True, help="path of the Pokemon Red ROM")
+    parser.add_argument("--state", default="../../states/has_pokedex_nballs.state")
+    parser.add_argument("--trace", help="recorded actions (trajectory log, .npy, .csv(.gz) or text), default: random from --seed")
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--layers", nargs="+", default=list(LAYERS), choices=LAYERS)
+    parser.add_argument(
+        "--workers", type=int, nargs="+", default=sorted({1, 4, 16, os.cpu_count() or 1})
+    )
+    parser.add_argument("--no-allocations", action="store_true", help="skip the tracemalloc passes")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    actions = load_trace(args.trace, args.steps, args.seed)
+    session_path = Path(tempfile.mkdtemp(prefix="benchmark_env_stack_"))
+    allocations = not args.no_allocations
+
+    results = []
+    for layer in args.layers:
+        if layer in LAYERS[:4]:
+            make_step = lambda: emulator_pipeline(layer, args.gb_path, args.state)
+            layer_results = [measure(layer, make_step, actions, args.warmup, allocations)]
+        elif layer == "env":
+            from RedGymEnv import RedGymEnv
+
+            def make_step():
+                config = env_config(args, session_path, max_steps=len(actions) + args.warmup + 1)
+                env = RedGymEnv(config)
+                env.reset(seed=args.seed + 1)
+                return env.step
+
+            layer_results = [measure(layer, make_step, actions, args.warmup, allocations)]
+        else:
+            layer_results = [
+                measure_vec_env(args, actions, num_envs, session_path) for num_envs in args.workers
+            ]
+        for result in layer_results:
+            line = (
+                f"{result['layer']:>12} x{result['workers']:<3} "
+                f"{result['steps_per_second']:10.1f} steps/s {result['us_per_step']:10.1f} us/step"
+            )
+            if "allocations" in result:
+                line += f" {result['allocations']['peak_bytes_per_step']:10.0f} B peak/step"
+            print(line, file=sys.stderr)
+        results.extend(layer_results)
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "rom_sha1": file_sha1(args.gb_path),
+            "state": args.state,
+            "state_sha1": file_sha1(args.state),
+            "trace": args.trace,
+            "trace_sha1": hashlib.sha1(actions.tobytes()).hexdigest(),
+            "steps": len(actions),
+            "warmup": args.warmup,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import argparse
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append("../core")
+
+MODES = ("plain", "template")
+
+
+def measure(mode, num_envs, env_config):
+    """Seconds until all workers are built and reset, and their resident memory after a few steps"""
+    start = time.perf_counter()
+    import WorkerTemplate
+    from RedGymEnv import make_env
+    from SharedMemoryVecEnv import SharedMemoryVecEnv
+
+    imported = time.perf_counter()
+    if mode == "template":
+        WorkerTemplate.preload(env_config)
+    vec_env = SharedMemoryVecEnv([make_env(i, env_config) for i in range(num_envs)])
+    try:
+        vec_env.reset()
+        ready = time.perf_counter()
+        # The pages a worker writes while stepping are not shared any more
+        for _ in range(10):
+            vec_env.step(np.zeros(num_envs, dtype=np.int64))
+        memory = WorkerTemplate.worker_memory(vec_env)
+    finally:
+        vec_env.close()
+    return {
+        "mode": mode,
+        "workers": num_envs,
+        "import_seconds": imported - start,
+        "startup_seconds": ready - imported,
+        "rss_per_worker": float(np.mean([m["rss"] for m in memory])),
+        "pss_per_worker": (
+            float(np.mean([m["pss"] for m in memory])) if memory[0]["pss"] is not None else None
+        ),
+        "parent_rss": WorkerTemplate.process_memory()["rss"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Startup time and memory of the rollout workers, with and without a WorkerTemplate"
+    )
+    parser.add_argument("--gb-path", default="../../PokemonRed.gb")
+    parser.add_argument("--state", default="../../states/has_pokedex_nballs.state")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--json", action="store_true", help="print one result as json, used per mode")
+    args = parser.parse_args()
+
+    session_path = Path("sessions/benchmark_startup")
+    session_path.mkdir(parents=True, exist_ok=True)
+    env_config = {
+        "headless": True,
+        "save_final_state": False,
+        "early_stop": False,
+        "action_freq": 24,
+        "init_state": args.state,
+        "max_steps": 2 ** 12,
+        "print_rewards": False,
+        "save_video": False,
+        "fast_video": True,
+        "session_path": session_path,
+        "gb_path": args.gb_path,
+        "debug": False,
+    }
+
+    if args.json:
+        print(json.dumps(measure(args.modes[0], args.workers, env_config)))
+        return
+
+    # Every mode in a fresh interpreter, the forkserver and the imports are per process
+    print(f"{'mode':>9} {'workers':>8} {'import s':>9} {'startup s':>10} {'RSS MiB':>8} {'PSS MiB':>8}")
+    for mode in args.modes:
+        output = subprocess.run(
+            [sys.executable, __file__, "--json", "--modes", mode, "--workers", str(args.workers),
+             "--gb-path", args.gb_path, "--state", args.state],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        pss = result["pss_per_worker"]
+        print(
+            f"{mode:>9} {result['workers']:8d} {result['import_seconds']:9.2f} "
+            f"{result['startup_seconds']:10.2f} {result['rss_per_worker'] / 2 ** 20:8.1f} "
+            f"{pss / 2 ** 20 if pss is not None else float('nan'):8.1f}"
+        )
+    print("(startup: vec env creation and first reset, memory: mean per worker)")
+
+
+if __name__ == "__main__":
+    main()
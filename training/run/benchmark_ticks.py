@@ -0,0 +1,46 @@
+import argparse
+import sys
+import time
+
+import numpy as np
+
+sys.path.append("../core")
+from PokeRed import PokeRed
+
+
+def measure_fps(poke_red, actions, fast_ticks):
+    run_action = poke_red.run_action_fast if fast_ticks else poke_red.run_action_rendered
+    start = time.perf_counter()
+    for action in actions:
+        run_action(action)
+    elapsed = time.perf_counter() - start
+    return len(actions) * poke_red.action_freq / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare emulator frames per second of the rendered and fast action loops"
+    )
+    parser.add_argument("--gb-path", default="../../PokemonRed.gb")
+    parser.add_argument("--state", default="../../states/has_pokedex_nballs.state")
+    parser.add_argument("--steps", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    poke_red = PokeRed(args.gb_path, hide_window=True)
+    actions = np.random.default_rng(args.seed).integers(
+        0, len(PokeRed.VALID_ACTIONS), size=args.steps
+    )
+
+    results = {}
+    for fast_ticks in (False, True):
+        poke_red.load_from_state(args.state)
+        results[fast_ticks] = measure_fps(poke_red, actions, fast_ticks)
+
+    print(f"rendered loop: {results[False]:10.0f} fps")
+    print(f"fast loop:     {results[True]:10.0f} fps")
+    print(f"speedup:       {results[True] / results[False]:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from stable_baselines3.common.vec_env import SubprocVecEnv
+
+sys.path.append("../core")
+from RedGymEnv import make_env
+from SharedMemoryVecEnv import SharedMemoryVecEnv
+from BatchedVecEnv import BatchedVecEnv
+
+BACKENDS = {
+    "subproc": SubprocVecEnv,
+    "shared": SharedMemoryVecEnv,
+    # SharedMemoryVecEnv stepping half of the envs at a time with send / recv
+    "async": SharedMemoryVecEnv,
+    # All envs in this process, their emulators stepped with one BatchedPokeRed
+    "batched": BatchedVecEnv,
+}
+
+
+def step_async(vec_env, actions):
+    """Every env steps through its own column of actions, like in the synchronous loop, but
+    the envs that are ready are stepped again without waiting for the others"""
+    steps = len(actions)
+    # The next row of actions of every env
+    cursors = np.zeros(vec_env.num_envs, dtype=np.int64)
+    env_ids = np.arange(vec_env.num_envs)
+    while True:
+        env_ids = env_ids[cursors[env_ids] < steps]
+        if len(env_ids):
+            vec_env.send(actions[cursors[env_ids], env_ids], env_ids)
+            cursors[env_ids] += 1
+        if not vec_env.pending:
+            break
+        env_ids, *_ = vec_env.recv(batch_size=max(1, vec_env.num_envs // 2))
+
+
+def measure(backend, num_envs, env_config, steps, seed):
+    vec_env = BACKENDS[backend]([make_env(i, env_config, seed=seed + 1) for i in range(num_envs)])
+    try:
+        vec_env.reset()
+        rng = np.random.default_rng(seed)
+        actions = rng.integers(0, vec_env.action_space.n, size=(steps, num_envs))
+        # A few steps to get past the first resets and page faults
+        for step_actions in actions[: min(10, steps)]:
+            vec_env.step(step_actions)
+        start = time.perf_counter()
+        if backend == "async":
+            step_async(vec_env, actions)
+        else:
+            for step_actions in actions:
+                vec_env.step(step_actions)
+        elapsed = time.perf_counter() - start
+        if backend in ("shared", "async"):
+            latency = vec_env.latency_stats()["all"]
+            print(
+                f"  {backend} {num_envs} workers step time: mean {latency['mean'] * 1e3:.2f} ms, "
+                f"p99 {latency['p99'] * 1e3:.2f} ms, max {latency['max'] * 1e3:.2f} ms"
+            )
+    finally:
+        vec_env.close()
+    return steps * num_envs / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Env steps per second of SharedMemoryVecEnv (sync and async) and BatchedVecEnv "
+        "against SubprocVecEnv"
+    )
+    parser.add_argument("--gb-path", default="../../PokemonRed.gb")
+    parser.add_argument("--state", default="../../states/has_pokedex_nballs.state")
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 16, 44])
+    parser.add_argument("--steps", type=int, default=200, help="vector steps per measurement")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    session_path = Path("sessions/benchmark_vec_env")
+    session_path.mkdir(parents=True, exist_ok=True)
+    env_config = {
+        "headless": True,
+        "save_final_state": False,
+        "early_stop": False,
+        "action_freq": 24,
+        "init_state": args.state,
+        "max_steps": 2 ** 12,
+        "print_rewards": False,
+        "save_video": False,
+        "fast_video": True,
+        "session_path": session_path,
+        "gb_path": args.gb_path,
+        "debug": False,
+    }
+
+    print(f"{'workers':>8} " + " ".join(f"{backend:>12}" for backend in args.backends))
+    for num_envs in args.workers:
+        results = [measure(backend, num_envs, env_config, args.steps, args.seed) for backend in args.backends]
+        print(f"{num_envs:8d} " + " ".join(f"{steps_per_second:12.1f}" for steps_per_second in results))
+    print("(env steps per second)")
+
+
+if __name__ == "__main__":
+    main()
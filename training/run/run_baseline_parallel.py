@@ -26,6 +26,9 @@ def main():
         "session_path": sess_path,
         "use_screen_explore": True,
         "extra_buttons": False,
+        # The default, observations are (46, 40, 3). Checkpoints from before
+        # frame stacking have one channel and need "frame_stacks": 1
+        "frame_stacks": 3,
     }
 
     num_cpu = 44  # 64 #46  # Also sets the number of episodes per training iteration
@@ -1,5 +1,7 @@
+import argparse
 import uuid
 import sys
+import time
 from os.path import exists
 from pathlib import Path
 
@@ -13,6 +15,11 @@ from datetime import datetime
 
 sys.path.append("../core")
 from RedGymEnv import RedGymEnv, make_env
+from NoveltyServer import NoveltyServer
+from VideoEncoderPool import VideoEncoderPool
+from SharedMemoryVecEnv import SharedMemoryVecEnv
+from BatchedVecEnv import BatchedVecEnv
+import WorkerTemplate
 
 from datetime import datetime
 
@@ -21,7 +28,36 @@ set_random_seed(datetime.now().microsecond)
 def get_timestamp():
     return datetime.now().strftime("%Y%m%d-%H%M%S")
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train PPO on Pokemon Red with parallel envs")
+    parser.add_argument(
+        "--shared-novelty",
+        action="store_true",
+        help="one frame novelty index for all workers (a NoveltyServer) instead of one per worker",
+    )
+    parser.add_argument(
+        "--vec-env",
+        choices=("shared", "subproc", "batched"),
+        default="shared",
+        help="SharedMemoryVecEnv (observations in shared memory), SB3's SubprocVecEnv, "
+        "or BatchedVecEnv (all envs in this process, stepped together)",
+    )
+    parser.add_argument(
+        "--video-encoders",
+        type=int,
+        default=0,
+        help="with save_video, encode the videos in this many separate processes instead of in the envs",
+    )
+    parser.add_argument(
+        "--worker-template",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="fork the workers from an env built once in the forkserver (see WorkerTemplate)",
+    )
+    return parser.parse_args()
+
 def main():
+    args = parse_args()
     ep_length = 2 ** 12 # = 
     session_id = str(uuid.uuid4())
     sess_path = Path(f"sessions/session_{get_timestamp()}_{session_id[:8]}")
@@ -49,10 +85,39 @@ def main():
         "frame_stacks": 1,
     }
 
+    if args.shared_novelty:
+        novelty_server = NoveltyServer()
+        env_config["novelty_mode"] = "shared"
+        env_config["novelty_address"] = novelty_server.start()
+
+    if env_config["save_video"] and args.video_encoders:
+        video_encoder_pool = VideoEncoderPool(args.video_encoders)
+        env_config["video_encoder_addresses"] = video_encoder_pool.start()
+
     print(env_config)
 
+    # Build the env once in the forkserver and fork the workers from it, instead of every worker
+    # importing everything and building its own
+    if args.worker_template:
+        WorkerTemplate.preload(env_config)
+
     num_cpu = 4  # Also sets the number of episodes per training iteration
-    env = SubprocVecEnv([make_env(i, env_config) for i in range(num_cpu)])
+    startup_start = time.perf_counter()
+    # SharedMemoryVecEnv is the same as SubprocVecEnv, but observations are passed in shared
+    # memory instead of pickled
+    vec_env_class = {
+        "shared": SharedMemoryVecEnv,
+        "subproc": SubprocVecEnv,
+        "batched": BatchedVecEnv,
+    }[args.vec_env]
+    env = vec_env_class([make_env(i, env_config) for i in range(num_cpu)])
+    env.reset()
+    worker_rss = [memory["rss"] for memory in WorkerTemplate.worker_memory(env)]
+    if worker_rss:
+        print(
+            f"{num_cpu} workers started in {time.perf_counter() - startup_start:.1f}s, "
+            f"RSS per worker {sum(worker_rss) / len(worker_rss) / 2 ** 20:.0f} MiB"
+        )
     
     models_path = Path(f"{sess_path}/models")
 
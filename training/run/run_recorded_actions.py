@@ -6,16 +6,28 @@ import pandas as pd
 
 sys.path.append("../core")
 from RedGymEnv import RedGymEnv
+from ReplayEngine import ReplayEngine
+from TrajectoryLog import TrajectoryLogReader
+from VideoEncoderPool import to_rgb
 
 
-def run_recorded_actions_on_emulator_and_save_video(sess_id, instance_id, run_index):
-    sess_path = Path(f"session_{sess_id}")
+def load_recorded_actions(sess_path, instance_id, run_index):
+    """Actions of one run, from the trajectory log of the env or else its agent_stats csv"""
+    log_path = sess_path / "trajectories" / instance_id
+    if log_path.exists():
+        return TrajectoryLogReader(log_path).episode(run_index)["action"].tolist()
+
     tdf = pd.read_csv(
-        f"session_{sess_id}/agent_stats_{instance_id}.csv.gz", compression="gzip"
+        sess_path / f"agent_stats_{instance_id}.csv.gz", compression="gzip"
     )
     tdf = tdf[tdf["map"] != "map"]  # remove unused
     action_arrays = np.array_split(tdf, np.array((tdf["step"].astype(int) == 0).sum()))
-    action_list = [int(x) for x in list(action_arrays[run_index]["last_action"])]
+    return [int(x) for x in list(action_arrays[run_index]["last_action"])]
+
+
+def run_recorded_actions_on_emulator_and_save_video(sess_id, instance_id, run_index):
+    sess_path = Path(f"session_{sess_id}")
+    action_list = load_recorded_actions(sess_path, instance_id, run_index)
     max_steps = len(action_list) - 1
 
     env_config = {
@@ -41,3 +53,20 @@ def run_recorded_actions_on_emulator_and_save_video(sess_id, instance_id, run_in
     for action in action_list:
         obs, rewards, term, trunc, info = env.step(action)
         env.render()
+
+
+def render_clip(sess_id, instance_id, run_index, start_step, num_steps, gb_path="../PokemonRed.gb"):
+    """Video of num_steps steps of a run from start_step, seeked to with the keyframes of its
+    trajectory log instead of replaying the run from the start"""
+    import mediapy as media
+
+    sess_path = Path(f"session_{sess_id}")
+    engine = ReplayEngine(gb_path, sess_path / "trajectories" / instance_id)
+    episode_length = int(engine.log.episodes[run_index]["length"])
+    start = engine.episode_row(run_index, start_step)
+    stop = engine.episode_row(run_index, min(start_step + num_steps, episode_length))
+    out_path = sess_path / f"clip_{instance_id}_{run_index}_{start_step}.mp4"
+    with media.VideoWriter(out_path, (144, 160), fps=60) as writer:
+        for frame in engine.frames(start, stop):
+            writer.add_image(to_rgb(frame))
+    return out_path